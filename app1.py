@@ -1,15 +1,34 @@
 import streamlit as st
-import requests
-import json
-import os
-import re
-from datetime import datetime
-from login import authenticate_user, initialize_user_database  # Import the login functions
+from login import authenticate_user, initialize_user_database, restore_session, end_session, write_session_cookie  # Import the login functions
+from http_pool import pool_stats
+from generation_cache import cache_stats as generation_cache_stats
+from retry_policy import retry_stats
+from backends import extra_models
+from token_budget import token_stats
+from singleflight import singleflight_stats
+from scheduler import scheduler_stats
+from codegen import DEFAULT_API_KEY, file_extensions, hedge_stats, stream_stats
+from jobs import FINISHED as JOB_FINISHED, POLL_SECONDS as JOB_POLL_SECONDS, STREAM_POLL_SECONDS as JOB_STREAM_POLL_SECONDS, submit as submit_job, get as get_job, cancel as cancel_job, job_stats
+from language_detect import detect_language_from_prompt
+from history_store import load_entries_cached, count_entries_cached, load_code, migrate_legacy_history_once, cache_stats as history_cache_stats
 import time
+import uuid
+from metrics import start_exporter as start_metrics_exporter, touch_session, metrics_stats
+from rerun_profiler import start_rerun as start_rerun_profile, finish_rerun as finish_rerun_profile
+from profiler_view import show_profiler_page
+
+# Profile this rerun if CODEGENIE_PROFILE=1 (see rerun_profiler)
+start_rerun_profile()
 
 # Initialize the user database at startup
 initialize_user_database()
 
+# Import legacy per-file history into the history store (only runs once)
+migrate_legacy_history_once()
+
+# Serve Prometheus metrics if configured (only starts once per process)
+start_metrics_exporter()
+
 # Add custom CSS with animations and color scheme
 def load_css():
     st.markdown("""
@@ -235,14 +254,17 @@ def load_css():
 if "authenticated" not in st.session_state:
     st.session_state["authenticated"] = False
 
-# Define file extensions dictionary - moved to global scope so it's accessible everywhere
-file_extensions = {
-    "Python": "py", "JavaScript": "js", "Java": "java", "C++": "cpp", 
-    "C": "c", "C#": "cs", "Go": "go", "Ruby": "rb", "PHP": "php",
-    "Swift": "swift", "Kotlin": "kt", "Rust": "rs", "TypeScript": "ts",
-    "HTML": "html", "CSS": "css", "SQL": "sql", "Shell/Bash": "sh",
-    "Perl": "pl", "R": "r", "MATLAB": "m"
-}
+# Count this browser session as active
+if "metrics_session_id" not in st.session_state:
+    st.session_state["metrics_session_id"] = uuid.uuid4().hex
+touch_session(st.session_state["metrics_session_id"])
+
+# Save or clear the session cookie after a login or logout
+write_session_cookie()
+
+# Returning browsers with a valid session token skip the login page
+if not st.session_state["authenticated"]:
+    restore_session()
 
 # Show login page if not authenticated
 if not st.session_state["authenticated"]:
@@ -280,50 +302,6 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-    # Pre-configured API key (embedded for hackathon purposes)
-    DEFAULT_API_KEY = "api-key"
-
-    # Function to detect programming language from user's prompt
-    def detect_language_from_prompt(prompt):
-        # Dictionary of programming languages and their related keywords/patterns
-        language_patterns = {
-            "Python": [r'\bpython\b', r'\.py\b', r'\bpip\b', r'\bdjango\b', r'\bflask\b', r'\bnumpy\b', r'\bpandas\b'],
-            "JavaScript": [r'\bjavascript\b', r'\bjs\b', r'\.js\b', r'\bnode\.js\b', r'\bnpm\b', r'\breact\b', r'\bangular\b', r'\bvue\b'],
-            "Java": [r'\bjava\b', r'\.java\b', r'\bspring\b', r'\bmaven\b', r'\bhibernate\b'],
-            "C++": [r'\bc\+\+\b', r'\.cpp\b', r'\bcmake\b', r'\bstl\b', r'\bvector<\b'],
-            "C": [r'\bc\b', r'\.c\b', r'\bpointer\b', r'\bmalloc\b', r'\bstdio\b', r'\bstdlib\b', r'\bprintf\b'],
-            "C#": [r'\bc#\b', r'\.cs\b', r'\bdotnet\b', r'\basync\b', r'\bawait\b', r'\busing\b'],
-            "Go": [r'\bgo\b', r'\bgolang\b', r'\.go\b', r'\bgoroutine\b'],
-            "Ruby": [r'\bruby\b', r'\.rb\b', r'\brails\b', r'\bgem\b'],
-            "PHP": [r'\bphp\b', r'\.php\b', r'\blaravel\b', r'\bsymphony\b'],
-            "Swift": [r'\bswift\b', r'\.swift\b', r'\bios\b', r'\bxcode\b', r'\bcocoa\b'],
-            "Kotlin": [r'\bkotlin\b', r'\.kt\b', r'\bandroid\b'],
-            "Rust": [r'\brust\b', r'\.rs\b', r'\bcargo\b', r'\bcrate\b'],
-            "TypeScript": [r'\btypescript\b', r'\bts\b', r'\.ts\b', r'\bangular\b', r'\bvue\b'],
-            "HTML": [r'\bhtml\b', r'\.html\b', r'\bhtml5\b', r'\bdiv\b', r'\bspan\b', r'\binput\b', r'\bform\b', r'\bmarkup\b'],
-            "CSS": [r'\bcss\b', r'\.css\b', r'\bstylesheet\b', r'\bstyle\b', r'\bflex\b', r'\bgrid\b', r'\bbootstrap\b'],
-            "SQL": [r'\bsql\b', r'\bmysql\b', r'\bpostgresql\b', r'\bselect\b', r'\bfrom\b', r'\bwhere\b', r'\bgroup by\b'],
-            "Shell/Bash": [r'\bbash\b', r'\bshell\b', r'\.sh\b', r'\blinux\b', r'\bunix\b', r'\bscript\b'],
-            "Perl": [r'\bperl\b', r'\.pl\b', r'\bregex\b'],
-            "R": [r'\br\b', r'\.r\b', r'\bstatistics\b', r'\bggplot\b', r'\bdplyr\b'],
-            "MATLAB": [r'\bmatlab\b', r'\.m\b', r'\bmatrix\b', r'\boctave\b']
-        }
-        
-        # Check for explicit language mentions
-        prompt_lower = prompt.lower()
-        for language, patterns in language_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, prompt_lower, re.IGNORECASE):
-                    return language
-        
-        # Look for language mentions like "in Python" or "using JavaScript"
-        for language in language_patterns.keys():
-            if f"in {language.lower()}" in prompt_lower or f"using {language.lower()}" in prompt_lower:
-                return language
-            
-        # Default to Python if no language is detected
-        return "Python"
-
     # Custom loading animation for API requests
     def show_loading_animation():
         st.markdown("""
@@ -344,53 +322,35 @@ else:
         </div>
         """, unsafe_allow_html=True)
 
-    # Function to load history
-    def load_history():
-        history_entries = []
-        
-        # Check for history directory
-        if os.path.exists("history"):
-            # Get all history files
-            history_files = [f for f in os.listdir("history") if f.startswith("code_")]
-            history_files.sort(reverse=True)  # Sort by newest first
-            
-            for file in history_files:
-                with open(os.path.join("history", file), "r") as f:
-                    content = f.read()
-                
-                # Extract metadata
-                prompt = ""
-                language = ""
-                timestamp = ""
-                username = ""
-                code = ""
-                
-                lines = content.split("\n")
-                for i, line in enumerate(lines):
-                    if line.startswith("Prompt:"):
-                        prompt = line[len("Prompt:"):].strip()
-                    elif line.startswith("Language:"):
-                        language = line[len("Language:"):].strip()
-                    elif line.startswith("Timestamp:"):
-                        timestamp = line[len("Timestamp:"):].strip()
-                    elif line.startswith("User:"):
-                        username = line[len("User:"):].strip()
-                    elif line.startswith("--- Generated Code ---"):
-                        code = "\n".join(lines[i+2:])
-                        break
-                
-                # Only show entries for the current user
-                if username == st.session_state['username']:
-                    history_entries.append({
-                        "prompt": prompt,
-                        "language": language,
-                        "timestamp": timestamp,
-                        "username": username,
-                        "code": code,
-                        "file": file
-                    })
-        
-        return history_entries
+    # Function to describe the retries a generation needed, for the result caption
+    def retry_note(info):
+        note = " (shared with an identical request already in progress)" if info.get("coalesced") else ""
+        if info.get("retries"):
+            note += f" after {info['retries']} retr{'y' if info['retries'] == 1 else 'ies'} ({info['retry_wait']:.1f}s waiting)"
+        if info.get("queue_wait", 0) >= 0.5:
+            note += f" · waited {info['queue_wait']:.1f}s in the queue"
+        return note
+
+    # Function to describe the tokens a generation used, for the result caption
+    def token_note(info):
+        if info.get("tokens") is None:
+            return ""
+        note = f" · {info['tokens']} tokens generated (budget {info['max_new_tokens']})"
+        if info.get("finish_reason") == "length":
+            note += ", stopped at the budget so the code may be cut off"
+        return note
+
+    # Function to load history for the current user, newest first (cached across reruns)
+    def load_history(limit=None, offset=0, include_code=True):
+        return load_entries_cached(st.session_state['username'], limit=limit, offset=offset, include_code=include_code)
+
+    # Function to count the current user's history entries
+    def count_history():
+        return count_entries_cached(st.session_state['username'])
+
+    # Function to load the code of one history entry on demand
+    def load_history_code(entry_id):
+        return load_code(entry_id, st.session_state['username'])
 
     # Sidebar for settings with animations
     with st.sidebar:
@@ -435,6 +395,8 @@ else:
             "CodeLlama 7B Instruct": "codellama/CodeLlama-7b-Instruct-hf",
             "Bloomz 7B1": "bigscience/bloomz-7b1"
         }
+        # Local servers or the offline stub, configured with CODEGENIE_EXTRA_MODELS
+        model_options.update(extra_models())
         
         # Prepare model cards with icons
         models_html = ""
@@ -445,6 +407,27 @@ else:
         selected_model = st.selectbox("Select AI Model", list(model_options.keys()))
         model_id = model_options[selected_model]
         
+        # Run several models side by side on the same prompt
+        compare_models = st.checkbox("Compare models", value=False)
+        if compare_models:
+            compared_models = st.multiselect("Models to compare", list(model_options.keys()),
+                                             default=list(model_options.keys()))
+        
+        # Send slow requests to a second model as well and keep whichever answers first
+        hedge_requests = st.checkbox("Hedge slow requests with a fallback model", value=False, disabled=compare_models,
+                                     help="If the selected model is slower than usual, the prompt is also sent to the fallback model.")
+        fallback_model_id = None
+        if hedge_requests and not compare_models:
+            fallback_options = [name for name in model_options if name != selected_model]
+            fallback_model_id = model_options[st.selectbox("Fallback model", fallback_options)]
+        
+        # Stream tokens into the page as they are generated (a hedged request returns the finished code)
+        stream_output = st.checkbox("Stream output", value=True, disabled=compare_models or hedge_requests)
+        stream_output = stream_output and not hedge_requests
+        
+        # Skip the response cache to get a fresh generation for the same prompt
+        bypass_cache = st.checkbox("Bypass response cache", value=False)
+        
         # Hidden settings (not shown in UI but still stored)
         max_length = 500  # default value
         temperature = 0.7  # default value
@@ -460,8 +443,8 @@ else:
         </div>
         """, unsafe_allow_html=True)
         
-        # Load history entries
-        history_entries = load_history()
+        # Load the latest history entries
+        history_entries = load_history(limit=5)
         
         if not history_entries:
             st.info("No history found. Generate some code first!")
@@ -497,6 +480,32 @@ else:
                         key=f"dl_hist_{i}"
                     )
         
+        # Performance counters, only shown to the admin account
+        if st.session_state['username'] == "admin":
+            with st.expander("📈 Diagnostics", expanded=False):
+                st.caption("History cache")
+                st.json(history_cache_stats())
+                st.caption("HTTP connection pool")
+                st.json(pool_stats())
+                st.caption("Streaming")
+                st.json(stream_stats())
+                st.caption("Generation cache")
+                st.json(generation_cache_stats())
+                st.caption("Retries")
+                st.json(retry_stats())
+                st.caption("Hedging")
+                st.json(hedge_stats())
+                st.caption("Token usage")
+                st.json(token_stats())
+                st.caption("Single-flight")
+                st.json(singleflight_stats())
+                st.caption("Scheduler")
+                st.json(scheduler_stats())
+                st.caption("Background jobs")
+                st.json(job_stats())
+                st.caption("Metrics")
+                st.json(metrics_stats())
+        
         # Add a logout button to the sidebar with animation
         st.markdown("<hr>", unsafe_allow_html=True)
         st.markdown("""
@@ -510,7 +519,7 @@ else:
             </div>
             """, unsafe_allow_html=True)
             time.sleep(1)  # Brief pause for animation
-            st.session_state["authenticated"] = False
+            end_session()
             st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
         
@@ -523,130 +532,6 @@ else:
         </div>
         """, unsafe_allow_html=True)
 
-    # Function to generate code using Hugging Face Inference API
-    def generate_code_api(prompt, language, model_id, max_length, temperature, api_key=DEFAULT_API_KEY):
-        # API endpoint
-        api_url = f"https://api-inference.huggingface.co/models/{model_id}"
-        
-        # Headers for the API request
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        # Construct the full prompt based on the model and language
-        file_ext = file_extensions.get(language, language.lower())
-        
-        # Special handling for HTML/CSS/JS combined projects
-        is_web_project = False
-        if "HTML" in prompt.upper() and "CSS" in prompt.upper():
-            is_web_project = True
-        
-        if "codellama" in model_id.lower():
-            # CodeLlama specific prompt
-            if is_web_project:
-                full_prompt = f"""
-                Write code based on this description:
-                {prompt}
-                
-                Include HTML structure, CSS styling, and JavaScript if needed.
-                Format the code properly with clear comments.
-                
-                Code:
-                
-                """
-            else:
-                full_prompt = f"""
-                Write a {language} function based on this description:
-                {prompt}
-                
-                Include necessary imports, clear comments, and format the code properly.
-                
-                {language} code:
-                {file_ext}
-                """
-        else:
-            # Generic prompt for other models
-            if is_web_project:
-                full_prompt = f"""
-                Task: Write code based on the following description.
-                Description: {prompt}
-                Requirements:
-                - Create proper HTML structure
-                - Add CSS styling
-                - Include JavaScript functionality if needed
-                - Format the code properly with clear sections
-                
-                CODE:
-                """
-            else:
-                full_prompt = f"""
-                Task: Write a {language} function based on the following description.
-                Description: {prompt}
-                Requirements:
-                - Include necessary imports
-                - Add clear comments
-                - Format the code properly
-                - Follow best practices for {language}
-                
-                {language} CODE:
-                """
-        
-        # Payload for the API request
-        payload = {
-            "inputs": full_prompt,
-            "parameters": {
-                "max_new_tokens": max_length,
-                "temperature": temperature,
-                "top_p": 0.95,
-                "do_sample": True
-            }
-        }
-        
-        try:
-            # Make the API request
-            response = requests.post(api_url, headers=headers, json=payload)
-            
-            # Check if the request was successful
-            if response.status_code == 200:
-                # Parse the response
-                output = response.json()
-                
-                # Extract the generated text
-                if isinstance(output, list) and len(output) > 0:
-                    generated_text = output[0].get("generated_text", "")
-                else:
-                    generated_text = str(output)
-                
-                # Extract only the code part (after the prompt)
-                code_part = generated_text[len(full_prompt):]
-                
-                # Improved code extraction logic
-                # Check for code blocks with triple backticks
-                if "```" in code_part:
-                    # Extract code between backticks
-                    code_blocks = re.findall(r'```(?:\w*\n)?(.*?)```', code_part, re.DOTALL)
-                    if code_blocks:
-                        # Join multiple code blocks if present
-                        code_part = "\n\n".join(code_blocks)
-                    else:
-                        # If regex failed but backticks exist, try simple split
-                        parts = code_part.split("```")
-                        if len(parts) > 1:
-                            # Get the content after the first ``` and before the next ```
-                            code_part = parts[1].strip()
-                
-                # Remove language identifier if it appears at the beginning of the code
-                code_part = re.sub(r'^(?:python|javascript|java|cpp|c\+\+|c#|go|ruby|php|swift|kotlin|rust|typescript|html|css|sql|bash|perl|r|matlab)\n', '', code_part, flags=re.IGNORECASE)
-                
-                return code_part.strip(), None
-            else:
-                error_msg = f"API request failed with status code {response.status_code}: {response.text}"
-                return None, error_msg
-        
-        except Exception as e:
-            return None, f"Error making API request: {str(e)}"
-
     # Function to explain code with animation
     def explain_code(code, language):
         # Language-specific keywords to look for in explanations
@@ -721,32 +606,170 @@ else:
         
         return explanation
 
-    # Function to save code history
-    def save_code_history(prompt, language, code):
-        # Create a directory for history if it doesn't exist
-        if not os.path.exists("history"):
-            os.makedirs("history")
-        
-        # Generate a timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Create a filename
-        filename = f"history/code_{timestamp}.txt"
+    # Function to get the code block highlighting for a programming language
+    def highlight_language(language):
+        return "bash" if language == "Shell/Bash" else language.lower()
+
+    # Function to show a model comparison job: one column per model, filled in as each answers
+    def show_comparison(job, finished):
+        file_ext = file_extensions.get(job["language"], job["language"].lower())
+        for compared_id, column in zip(job["compare"], st.columns(len(job["compare"]))):
+            with column:
+                st.markdown(f"<h3>{job['model_names'].get(compared_id, compared_id)}</h3>", unsafe_allow_html=True)
+                result = job["results"].get(compared_id)
+                if result is None:
+                    if not finished:
+                        show_loading_animation()
+                    continue
+                if result["error"]:
+                    st.error(f"Error generating code: {result['error']}")
+                    continue
+                compared_info = result["info"]
+                st.code(result["code"], language=highlight_language(job["language"]))
+                st.caption("⚡ Served from the response cache" if compared_info["cache_hit"]
+                           else f"Done in {compared_info['elapsed']:.2f}s{retry_note(compared_info)}{token_note(compared_info)}")
+                if finished:
+                    st.download_button(
+                        label="📄 Download Code",
+                        data=result["code"],
+                        file_name=f"generated_code_{compared_id.split('/')[-1]}.{file_ext}",
+                        mime="text/plain",
+                        key=f"dl_compare_{compared_id}"
+                    )
+
+    # Function to follow a running generation job. As a fragment it reruns by itself every
+    # JOB_POLL_SECONDS (JOB_STREAM_POLL_SECONDS for streamed code) without rerunning the page;
+    # without fragment support a refresh button polls.
+    def show_generation_progress(job_id):
+        job = get_job(job_id)
+        if job is None or job["status"] in JOB_FINISHED:
+            # Rerun the page so the result is shown outside the polling fragment
+            st.rerun()
+        if job["queue_position"]:
+            st.info(f"⏳ The service is busy: you are number {job['queue_position']} in the queue, "
+                    f"about {job['queue_eta']:.0f}s to wait")
+        if job["compare"]:
+            show_comparison(job, finished=False)
+        elif job["partial"]:
+            st.code(job["partial"], language=highlight_language(job["language"]))
+        else:
+            show_loading_animation()
+        st.caption("You can browse your history while the code is generated; it is saved there when done.")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✖️ Cancel generation", key=f"cancel_{job_id}"):
+                cancel_job(job_id)
+        if not hasattr(st, "fragment"):
+            with col2:
+                st.button("🔄 Refresh", key=f"refresh_{job_id}")
+
+    follow_generation_stream = show_generation_progress
+    if hasattr(st, "fragment"):
+        follow_generation_stream = st.fragment(run_every=JOB_STREAM_POLL_SECONDS)(show_generation_progress)
+        show_generation_progress = st.fragment(run_every=JOB_POLL_SECONDS)(show_generation_progress)
+
+    # Function to show a finished generation job
+    def show_generation_result(job):
+        generation_job = st.session_state["generation_job"]
+        info = job["info"]
+        # Toasts are shown once per job, not on every rerun
+        announce = not generation_job.get("announced")
+        generation_job["announced"] = True
+        
+        if job["status"] == "cancelled":
+            st.warning("Generation cancelled.")
+            return
+        
+        if job["compare"]:
+            # Each model's answer or error is shown in its own column
+            if generation_job["auto_detected"]:
+                st.info(f"CodeGenie detected you want code in: {job['language']}")
+            show_comparison(job, finished=True)
+            st.caption(f"All models finished in {job['finished'] - job['submitted']:.2f}s")
+            if announce:
+                show_toast("Model comparison finished!" if not job["error"] else "Every model failed",
+                           type="error" if job["error"] else "success")
+            return
+        if job["error"]:
+            st.error(f"Error generating code: {job['error']}")
+            if info.get("retries"):
+                st.caption(f"Retried {info['retries']} time(s), waiting {info['retry_wait']:.1f}s in total")
+            if announce:
+                show_toast("Failed to generate code", type="error")
+            return
+        
+        # Show notification about language detection if auto-detect was used
+        if generation_job["auto_detected"]:
+            st.info(f"CodeGenie detected you want code in: {job['language']}")
+        
+        # Display the generated code with animation
+        st.markdown("""
+        <div style="animation: fadeIn 0.8s ease-out;">
+            <h3>✅ Generated Code:</h3>
+        </div>
+        """, unsafe_allow_html=True)
         
-        # Save the code with metadata
-        with open(filename, "w") as f:
-            f.write(f"Prompt: {prompt}\n")
-            f.write(f"Language: {language}\n")
-            f.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"User: {st.session_state['username']}\n")
-            f.write(f"Model: {selected_model}\n")
-            f.write("\n--- Generated Code ---\n\n")
-            f.write(code)
+        generated_code = job["code"]
+        st.code(generated_code, language=highlight_language(job["language"]))
+        if info["cache_hit"]:
+            st.caption("⚡ Served from the response cache")
+        elif info.get("ttft") is not None:
+            st.caption(f"First token after {info['ttft']:.2f}s, done in {info['total_time']:.2f}s"
+                       f"{retry_note(info)}{token_note(info)}")
+        else:
+            st.caption(f"Done{retry_note(info)}{token_note(info)}")
+        if info.get("winner") == "fallback":
+            st.caption(f"⏱️ {job['model_names'].get(job['model_id'], job['model_id'])} was slow, "
+                       f"so this answer came from the fallback model")
+        
+        # Show success notification
+        if announce:
+            show_toast("Code successfully generated!")
+        
+        # Prepare file extension for download
+        file_ext = file_extensions.get(job["language"], job["language"].lower())
+        
+        # Create columns for the buttons
+        col1, col2 = st.columns(2)
+        
+        # Download button
+        with col1:
+            st.download_button(
+                label="📄 Download Code",
+                data=generated_code,
+                file_name=f"generated_code.{file_ext}",
+                mime="text/plain"
+            )
         
-        return filename
+        # Copy to clipboard button (uses JavaScript)
+        with col2:
+            escaped_code = generated_code.replace('`', '\\`').replace('\\', '\\\\').replace('$', '\\$')
+            st.markdown(f"""
+            <button onclick="
+                navigator.clipboard.writeText(`{escaped_code}`)
+                .then(() => alert('Code copied to clipboard!'))
+                .catch(err => alert('Error copying code: ' + err));
+            " style="
+                background: linear-gradient(135deg, #43CBFF 10%, #9708CC 100%);
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 0.5rem 1rem;
+                transition: all 0.3s ease;
+                transform: translateY(0);
+                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+                cursor: pointer;
+                width: 100%;
+            ">📋 Copy to Clipboard</button>
+            """, unsafe_allow_html=True)
 
     # Main sections with tabs and animations
-    tab1, tab2 = st.tabs(["💻 Generate Code", "📊 History"])
+    # The admin also gets the rerun profiler (see profiler_view)
+    tab_names = ["💻 Generate Code", "📊 History"]
+    if st.session_state['username'] == "admin":
+        tab_names.append("⏱️ Profiler")
+    tabs = st.tabs(tab_names)
+    tab1, tab2 = tabs[0], tabs[1]
     
     with tab1:
         st.markdown("""
@@ -765,95 +788,44 @@ else:
             # Check if the prompt is empty
             if not prompt:
                 st.error("Please enter a description of what you want to code.")
+            elif compare_models and not compared_models:
+                st.error("Select at least one model to compare.")
             else:
-                # Show loading animation
-                with st.spinner():
-                    show_loading_animation()
-                    
-                    # Auto-detect language if enabled
-                    if auto_detect:
-                        detected_language = detect_language_from_prompt(prompt)
-                        st.session_state["programming_language"] = detected_language
-                    
-                    # Generate the code
-                    generated_code, error = generate_code_api(
-                        prompt, 
-                        st.session_state["programming_language"], 
-                        model_id, 
-                        max_length, 
-                        temperature, 
-                        api_key
-                    )
-                    
-                    # Hide the loading animation
-                    st.empty()
+                # Auto-detect language if enabled
+                if auto_detect:
+                    detected_language = detect_language_from_prompt(prompt)
+                    st.session_state["programming_language"] = detected_language
                 
-                # Display the results or error
-                if error:
-                    st.error(f"Error generating code: {error}")
-                    show_toast("Failed to generate code", type="error")
-                else:
-                    # Determine language for code highlighting
-                    highlight_lang = st.session_state["programming_language"].lower()
-                    if highlight_lang == "shell/bash":
-                        highlight_lang = "bash"
-                    
-                    # Show notification about language detection if auto-detect was used
-                    if auto_detect:
-                        st.info(f"CodeGenie detected you want code in: {st.session_state['programming_language']}")
-                    
-                    # Display the generated code with animation
-                    st.markdown("""
-                    <div style="animation: fadeIn 0.8s ease-out;">
-                        <h3>✅ Generated Code:</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.code(generated_code, language=highlight_lang)
-                    
-                    # Save to history
-                    history_file = save_code_history(prompt, st.session_state["programming_language"], generated_code)
-                    
-                    # Show success notification
-                    show_toast("Code successfully generated!")
-                    
-                    # Prepare file extension for download
-                    file_ext = file_extensions.get(st.session_state["programming_language"], 
-                                                   st.session_state["programming_language"].lower())
-                    
-                    # Create columns for the buttons
-                    col1, col2 = st.columns(2)
-                    
-                    # Download button
-                    with col1:
-                        st.download_button(
-                            label="📄 Download Code",
-                            data=generated_code,
-                            file_name=f"generated_code.{file_ext}",
-                            mime="text/plain"
-                        )
-                    
-                    # Copy to clipboard button (uses JavaScript)
-                    with col2:
-                        escaped_code = generated_code.replace('`', '\\`').replace('\\', '\\\\').replace('$', '\\$')
-                        st.markdown(f"""
-                        <button onclick="
-                            navigator.clipboard.writeText(`{escaped_code}`)
-                            .then(() => alert('Code copied to clipboard!'))
-                            .catch(err => alert('Error copying code: ' + err));
-                        " style="
-                            background: linear-gradient(135deg, #43CBFF 10%, #9708CC 100%);
-                            color: white;
-                            border: none;
-                            border-radius: 8px;
-                            padding: 0.5rem 1rem;
-                            transition: all 0.3s ease;
-                            transform: translateY(0);
-                            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                            cursor: pointer;
-                            width: 100%;
-                        ">📋 Copy to Clipboard</button>
-                        """, unsafe_allow_html=True)
+                # Run the generation in the background; the job view below follows it.
+                # A comparison sends the prompt to each selected model instead.
+                job_id = submit_job(
+                    st.session_state["username"],
+                    prompt, 
+                    st.session_state["programming_language"], 
+                    model_id, 
+                    max_length, 
+                    temperature, 
+                    api_key,
+                    use_cache=not bypass_cache,
+                    stream=stream_output,
+                    fallback_model_id=fallback_model_id,
+                    model_names={option_id: name for name, option_id in model_options.items()},
+                    compare_model_ids=[model_options[name] for name in compared_models] if compare_models else None
+                )
+                st.session_state["generation_job"] = {"id": job_id, "auto_detected": auto_detect}
+        
+        # Show the latest generation job: its progress while it runs, then its result
+        if st.session_state.get("generation_job"):
+            job = get_job(st.session_state["generation_job"]["id"])
+            if job is None:
+                # Expired, or the server was restarted
+                del st.session_state["generation_job"]
+            elif job["status"] in JOB_FINISHED:
+                show_generation_result(job)
+            elif job["stream"]:
+                follow_generation_stream(job["id"])
+            else:
+                show_generation_progress(job["id"])
 
     with tab2:
         st.markdown("""
@@ -863,22 +835,45 @@ else:
         </div>
         """, unsafe_allow_html=True)
         
-        # Load all history entries
-        history_entries = load_history()
+        # Count history entries; only the current page is loaded below
+        total_entries = count_history()
         
-        if not history_entries:
+        if not total_entries:
             st.info("No code generation history found. Generate some code first!")
         else:
+            # Page controls
+            col1, col2 = st.columns(2)
+            with col1:
+                page_size = st.selectbox("Entries per page", [10, 25, 50, 100], key="history_page_size")
+            page_count = (total_entries + page_size - 1) // page_size
+            # Keep the page number in range when the page size grows or entries change
+            if st.session_state.get("history_page", 1) > page_count:
+                st.session_state["history_page"] = page_count
+            with col2:
+                page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="history_page")
+            
+            offset = (page - 1) * page_size
+            st.caption(f"Showing {offset + 1}-{min(offset + page_size, total_entries)} of {total_entries} entries")
+            
+            # Load only this page, without code bodies
+            history_entries = load_history(limit=page_size, offset=offset, include_code=False)
+            
             # Display history in reverse chronological order with cards
             for i, entry in enumerate(history_entries):
-                with st.expander(f"{entry['timestamp']} - {entry['language']}: {entry['prompt'][:50]}...", expanded=(i == 0)):
+                with st.expander(f"{entry['timestamp']} - {entry['language']}: {entry['prompt'][:50]}...", expanded=(page == 1 and i == 0)):
+                    # Code is only read and sent once the user asks for it
+                    if not st.toggle("Show code", value=(page == 1 and i == 0), key=f"show_code_{entry['id']}"):
+                        continue
+                    
+                    code = load_history_code(entry['id'])
+                    
                     # Determine language for syntax highlighting
                     highlight_lang = entry['language'].lower()
                     if highlight_lang == "shell/bash":
                         highlight_lang = "bash"
                     
                     # Display the code
-                    st.code(entry['code'], language=highlight_lang)
+                    st.code(code, language=highlight_lang)
                     
                     # Create columns for buttons
                     col1, col2 = st.columns(2)
@@ -889,15 +884,15 @@ else:
                         timestamp_str = entry['timestamp'].replace(':', '-').replace(' ', '_')
                         st.download_button(
                             label="📄 Download Code",
-                            data=entry['code'],
+                            data=code,
                             file_name=f"history_{timestamp_str}.{file_ext}",
                             mime="text/plain",
-                            key=f"dl_{i}"
+                            key=f"dl_{entry['id']}"
                         )
                     
                     # Copy to clipboard button
                     with col2:
-                        escaped_code = entry['code'].replace('`', '\\`').replace('\\', '\\\\').replace('$', '\\$')
+                        escaped_code = code.replace('`', '\\`').replace('\\', '\\\\').replace('$', '\\$')
                         st.markdown(f"""
                         <button onclick="
                             navigator.clipboard.writeText(`{escaped_code}`)
@@ -917,6 +912,13 @@ else:
                         ">📋 Copy to Clipboard</button>
                         """, unsafe_allow_html=True)
 
+    if len(tabs) > 2:
+        with tabs[2]:
+            show_profiler_page()
+
+# End of the rerun: log its profile if profiling is on
+finish_rerun_profile(st.session_state.get("username"))
+
 # Run the app when this script is executed
 if __name__ == "__main__":
     pass  # The Streamlit app runs automatically
\ No newline at end of file
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import http_pool
+from storage import atomic_write
+
+# Lottie JSON is kept here; drop files named after the URL hash in this directory
+# to run fully offline (see lottie_path()).
+LOTTIE_DIR = os.environ.get("CODEGENIE_LOTTIE_DIR", os.path.join("assets", "lottie"))
+FETCH_TIMEOUT = float(os.environ.get("CODEGENIE_LOTTIE_TIMEOUT", "2"))
+RETRY_AFTER = float(os.environ.get("CODEGENIE_LOTTIE_RETRY_AFTER", "300"))  # seconds before retrying a failed URL
+
+# Process-wide cache: url -> animation JSON
+_animations = {}
+# url -> time of the last failed fetch
+_failures = {}
+_fetching = set()
+_lock = threading.Lock()
+
+# Function to get the on-disk location of a cached animation
+def lottie_path(url):
+    return os.path.join(LOTTIE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+# Function to write the animation next to the others, atomically
+def _save_to_disk(url, animation):
+    try:
+        atomic_write(lottie_path(url), json.dumps(animation))
+    except OSError:
+        pass
+
+# Function to download an animation in the background
+def _fetch(url):
+    animation = None
+    try:
+        response = http_pool.request("GET", url, timeout=(FETCH_TIMEOUT, FETCH_TIMEOUT))
+        if response.status_code == 200:
+            animation = response.json()
+    except Exception:
+        animation = None
+
+    with _lock:
+        _fetching.discard(url)
+        if animation is None:
+            _failures[url] = time.monotonic()
+        else:
+            _animations[url] = animation
+    if animation is not None:
+        _save_to_disk(url, animation)
+
+# Function to get a Lottie animation without waiting on the network.
+# Returns the JSON from memory or disk; otherwise starts a background download
+# and returns None so the caller can show a placeholder for this render.
+def get_lottie(url):
+    with _lock:
+        animation = _animations.get(url)
+    if animation is not None:
+        return animation
+
+    path = lottie_path(url)
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                animation = json.load(f)
+            with _lock:
+                _animations[url] = animation
+            return animation
+        except (OSError, ValueError):
+            pass
+
+    with _lock:
+        failed_at = _failures.get(url)
+        if url in _fetching or (failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER):
+            return None
+        _fetching.add(url)
+    threading.Thread(target=_fetch, args=(url,), daemon=True, name="codegenie-lottie").start()
+    return None
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import time
+
+import retry_policy
+
+# Inference backends. A model_id picks its backend with a prefix:
+#   mistralai/Mistral-7B-Instruct-v0.2   Hugging Face Inference API (no prefix, or "hf:")
+#   openai:<model>                       OpenAI-compatible server (vLLM, TGI, LM Studio, ...)
+#   llamacpp:<name>                      llama.cpp server
+#   stub:<name>                          in-process stub, no network at all
+
+# Hugging Face Inference API endpoint
+HF_API_URL = "https://api-inference.huggingface.co/models/{model_id}"
+
+# Local servers, overridable through the environment
+OPENAI_BASE_URL = os.environ.get("CODEGENIE_OPENAI_BASE_URL", "http://localhost:8000/v1")
+OPENAI_API_KEY = os.environ.get("CODEGENIE_OPENAI_API_KEY", "")
+LLAMACPP_URL = os.environ.get("CODEGENIE_LLAMACPP_URL", "http://localhost:8080")
+
+# Stub behaviour: seconds before the first token, seconds per token, lines of code per answer
+STUB_LATENCY = float(os.environ.get("CODEGENIE_STUB_LATENCY", "0"))
+STUB_TOKEN_DELAY = float(os.environ.get("CODEGENIE_STUB_TOKEN_DELAY", "0"))
+STUB_LINES = int(os.environ.get("CODEGENIE_STUB_LINES", "20"))
+
+# Function to copy reported token usage into the info dict
+def _store_usage(info, usage):
+    if usage is not None:
+        info["tokens"], info["finish_reason"] = usage
+
+# Base class for backends reached over HTTP. Subclasses describe the request and
+# how to read the answer; retries, deadlines and streaming are handled here.
+class HTTPBackend:
+    name = "http"
+
+    # Function to build (url, headers, payload) for one request
+    def build_request(self, model_name, full_prompt, max_length, temperature, api_key, stream, stop=None):
+        raise NotImplementedError
+
+    # Function to get the generated text out of a JSON response
+    def parse_response(self, output, full_prompt):
+        raise NotImplementedError
+
+    # Function to read one streamed event. Returns (text, error); text may be empty.
+    def parse_event(self, event):
+        raise NotImplementedError
+
+    # Function to read (generated tokens, finish reason) from a response or streamed event.
+    # Returns None when it carries no usage; finish reasons follow TGI: length, eos_token, stop_sequence.
+    def parse_usage(self, output):
+        return None
+
+    # Function to generate the whole completion. Returns (generated text, error).
+    # Token usage, when the server reports it, goes into info["tokens"] and info["finish_reason"].
+    def complete(self, model_name, full_prompt, max_length, temperature, api_key, info, deadline=None, cancel=None, stop=None):
+        url, headers, payload = self.build_request(model_name, full_prompt, max_length, temperature, api_key,
+                                                   stream=False, stop=stop)
+        response, error = retry_policy.post_with_retries(url, info, deadline=deadline, cancel=cancel,
+                                                         headers=headers, json=payload)
+        if error:
+            return None, error
+        if response.status_code != 200:
+            return None, f"API request failed with status code {response.status_code}: {response.text}"
+        output = response.json()
+        _store_usage(info, self.parse_usage(output))
+        return self.parse_response(output, full_prompt), None
+
+    # Function to stream the completion as text chunks. Errors are stored in info["error"].
+    def stream(self, model_name, full_prompt, max_length, temperature, api_key, info, deadline=None, cancel=None, stop=None):
+        url, headers, payload = self.build_request(model_name, full_prompt, max_length, temperature, api_key,
+                                                   stream=True, stop=stop)
+        response, info["error"] = retry_policy.post_with_retries(url, info, deadline=deadline, cancel=cancel,
+                                                                 headers=headers, json=payload, stream=True)
+        if response is None:
+            return
+        with response:
+            if response.status_code != 200:
+                info["error"] = f"API request failed with status code {response.status_code}: {response.text}"
+                return
+            # Server-sent events: one "data:{json}" line per chunk. SSE is always UTF-8, even when
+            # the Content-Type header does not say so.
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                event = json.loads(data)
+                _store_usage(info, self.parse_usage(event))
+                text, error = self.parse_event(event)
+                if error:
+                    info["error"] = f"API stream failed: {error}"
+                    return
+                if text:
+                    yield text
+
+# Hugging Face Inference API (text-generation-inference schema)
+class HuggingFaceBackend(HTTPBackend):
+    name = "hf"
+
+    def build_request(self, model_name, full_prompt, max_length, temperature, api_key, stream, stop=None):
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        payload = {
+            "inputs": full_prompt,
+            "parameters": {
+                "max_new_tokens": max_length,
+                "temperature": temperature,
+                "top_p": 0.95,
+                "do_sample": True
+            }
+        }
+        if stop:
+            payload["parameters"]["stop"] = stop
+        if stream:
+            payload["stream"] = True
+        else:
+            # Only send back the generated text, not the prompt again, plus the token count
+            payload["parameters"]["return_full_text"] = False
+            payload["parameters"]["details"] = True
+        return HF_API_URL.format(model_id=model_name), headers, payload
+
+    def parse_response(self, output, full_prompt):
+        if isinstance(output, list) and len(output) > 0:
+            generated_text = output[0].get("generated_text", "")
+        else:
+            generated_text = str(output)
+        # Servers that ignore return_full_text still echo the prompt
+        if generated_text.startswith(full_prompt):
+            return generated_text[len(full_prompt):]
+        return generated_text
+
+    def parse_usage(self, output):
+        if isinstance(output, list) and output:
+            output = output[0]
+        details = output.get("details") if isinstance(output, dict) else None
+        if not details:
+            return None
+        return details.get("generated_tokens"), details.get("finish_reason")
+
+    def parse_event(self, event):
+        if "error" in event:
+            return None, event["error"]
+        token = event.get("token") or {}
+        if token.get("special"):
+            return "", None
+        return token.get("text") or "", None
+
+# OpenAI-compatible completions endpoint
+class OpenAIBackend(HTTPBackend):
+    name = "openai"
+
+    def build_request(self, model_name, full_prompt, max_length, temperature, api_key, stream, stop=None):
+        headers = {"Content-Type": "application/json"}
+        if OPENAI_API_KEY:
+            headers["Authorization"] = f"Bearer {OPENAI_API_KEY}"
+        payload = {
+            "model": model_name,
+            "prompt": full_prompt,
+            "max_tokens": max_length,
+            "temperature": temperature,
+            "top_p": 0.95,
+            "stream": stream
+        }
+        if stop:
+            payload["stop"] = stop
+        return OPENAI_BASE_URL.rstrip("/") + "/completions", headers, payload
+
+    def parse_response(self, output, full_prompt):
+        return output["choices"][0].get("text", "")
+
+    def parse_usage(self, output):
+        finish_reason = (output.get("choices") or [{}])[0].get("finish_reason")
+        tokens = (output.get("usage") or {}).get("completion_tokens")
+        if finish_reason is None and tokens is None:
+            return None
+        # OpenAI reports "stop" for both the end-of-text token and a stop sequence
+        return tokens, "stop_sequence" if finish_reason == "stop" else finish_reason
+
+    def parse_event(self, event):
+        if "error" in event:
+            return None, event["error"]
+        choices = event.get("choices") or [{}]
+        return choices[0].get("text") or "", None
+
+# llama.cpp server /completion endpoint
+class LlamaCppBackend(HTTPBackend):
+    name = "llamacpp"
+
+    def build_request(self, model_name, full_prompt, max_length, temperature, api_key, stream, stop=None):
+        payload = {
+            "prompt": full_prompt,
+            "n_predict": max_length,
+            "temperature": temperature,
+            "top_p": 0.95,
+            "stream": stream
+        }
+        if stop:
+            payload["stop"] = stop
+        return LLAMACPP_URL.rstrip("/") + "/completion", {"Content-Type": "application/json"}, payload
+
+    def parse_response(self, output, full_prompt):
+        return output.get("content", "")
+
+    def parse_usage(self, output):
+        if "tokens_predicted" not in output:
+            return None
+        if output.get("stopped_word"):
+            finish_reason = "stop_sequence"
+        elif output.get("stopped_limit"):
+            finish_reason = "length"
+        else:
+            finish_reason = "eos_token"
+        return output["tokens_predicted"], finish_reason
+
+    def parse_event(self, event):
+        if "error" in event:
+            return None, event["error"]
+        return event.get("content") or "", None
+
+# In-process stub: answers with deterministic code, so the whole pipeline can run and be
+# benchmarked without any network. Like a model, it continues a prompt that ends inside a
+# code block, honours stop sequences and stops at max_length (about 8 tokens per line).
+class StubBackend:
+    name = "stub"
+
+    # Function to build the stub's answer to a prompt. Returns (text, tokens, finish reason).
+    def answer(self, model_name, full_prompt, max_length, stop=None):
+        seed = hashlib.sha1(full_prompt.encode("utf-8")).hexdigest()[:8]
+        lines = [f"# {model_name} stub answer {seed}"]
+        lines += [f"value_{i} = {i} * {i}" for i in range(STUB_LINES)]
+        lines.append("```")
+        lines.append("This code was generated by the stub backend.")
+        if full_prompt.count("```") % 2 == 0:
+            # The prompt did not open a code block, so the answer does
+            lines.insert(0, "Here is the code:\n```python")
+
+        limit = max(1, max_length // 8)
+        finish_reason = "length" if len(lines) > limit else "eos_token"
+        text = "\n".join(lines[:limit])
+        for sequence in stop or []:
+            if sequence in text:
+                text = text[:text.index(sequence)]
+                finish_reason = "stop_sequence"
+        return text, 8 * (text.count("\n") + 1), finish_reason
+
+    def complete(self, model_name, full_prompt, max_length, temperature, api_key, info, deadline=None, cancel=None, stop=None):
+        info.setdefault("retries", 0)
+        info.setdefault("retry_wait", 0.0)
+        text, tokens, finish_reason = self.answer(model_name, full_prompt, max_length, stop)
+        time.sleep(STUB_LATENCY + STUB_TOKEN_DELAY * (text.count("\n") + 1))
+        _store_usage(info, (tokens, finish_reason))
+        return text, None
+
+    def stream(self, model_name, full_prompt, max_length, temperature, api_key, info, deadline=None, cancel=None, stop=None):
+        info.setdefault("retries", 0)
+        info.setdefault("retry_wait", 0.0)
+        text, tokens, finish_reason = self.answer(model_name, full_prompt, max_length, stop)
+        time.sleep(STUB_LATENCY)
+        for line in text.splitlines(keepends=True):
+            if STUB_TOKEN_DELAY:
+                time.sleep(STUB_TOKEN_DELAY)
+            yield line
+        _store_usage(info, (tokens, finish_reason))
+
+BACKENDS = {
+    "hf": HuggingFaceBackend(),
+    "openai": OpenAIBackend(),
+    "llamacpp": LlamaCppBackend(),
+    "stub": StubBackend()
+}
+
+# Function to find the backend of a model_id. Returns (backend, model name for that backend).
+def resolve(model_id):
+    prefix, sep, model_name = model_id.partition(":")
+    if sep and prefix in BACKENDS:
+        return BACKENDS[prefix], model_name
+    return BACKENDS["hf"], model_id
+
+# Function to read extra models for the model selector from CODEGENIE_EXTRA_MODELS,
+# e.g. "Local CodeLlama=llamacpp:codellama-7b;Offline stub=stub:demo"
+def extra_models():
+    models = {}
+    for entry in os.environ.get("CODEGENIE_EXTRA_MODELS", "").split(";"):
+        name, sep, model_id = entry.partition("=")
+        if sep and name.strip() and model_id.strip():
+            models[name.strip()] = model_id.strip()
+    return models
@@ -0,0 +1,55 @@
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import HuggingFaceBackend
+from codegen import build_prompt, extract_code
+
+# Benchmark of response parsing: the previous echo-and-slice + regex extraction against
+# return_full_text=False + the precompiled single-pass extractor.
+# Run with: python benchmarks/bench_extract_code.py
+
+PROMPT = "Create a function that takes a list of numbers and returns the sum of all even numbers"
+MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
+
+# Previous implementation, re-parsing its patterns on every call
+def legacy_extract_code(code_part):
+    if "```" in code_part:
+        code_blocks = re.findall(r'```(?:\w*\n)?(.*?)```', code_part, re.DOTALL)
+        if code_blocks:
+            code_part = "\n\n".join(code_blocks)
+        else:
+            parts = code_part.split("```")
+            if len(parts) > 1:
+                code_part = parts[1].strip()
+    code_part = re.sub(r'^(?:python|javascript|java|cpp|c\+\+|c#|go|ruby|php|swift|kotlin|rust|typescript|html|css|sql|bash|perl|r|matlab)\n', '', code_part, flags=re.IGNORECASE)
+    return code_part.strip()
+
+# Function to build a model answer with the given number of code lines
+def make_answer(lines):
+    code = "\n".join(f"    total += numbers[{i}] if numbers[{i}] % 2 == 0 else 0" for i in range(lines))
+    return f"Here is the code:\n```python\ndef sum_even(numbers):\n    total = 0\n{code}\n    return total\n```\nThis sums the even numbers."
+
+# Function to time a parser in microseconds per call
+def time_per_call(fn, repeat=5, number=2000):
+    return min(timeit.Timer(fn).repeat(repeat=repeat, number=number)) / number * 1e6
+
+if __name__ == "__main__":
+    full_prompt = build_prompt(PROMPT, "Python", MODEL_ID)
+    backend = HuggingFaceBackend()
+
+    print(f"{'lines':>6} {'echoed bytes':>13} {'bytes':>8} {'legacy us':>10} {'current us':>11} {'speedup':>8}")
+    for lines in (5, 40, 200):
+        answer = make_answer(lines)
+        echoed = json.dumps([{"generated_text": full_prompt + answer}])
+        slim = json.dumps([{"generated_text": answer}])
+        assert legacy_extract_code(json.loads(echoed)[0]["generated_text"][len(full_prompt):]) == \
+            extract_code(backend.parse_response(json.loads(slim), full_prompt))
+
+        legacy = time_per_call(lambda: legacy_extract_code(json.loads(echoed)[0]["generated_text"][len(full_prompt):]))
+        current = time_per_call(lambda: extract_code(backend.parse_response(json.loads(slim), full_prompt)))
+        print(f"{lines:>6} {len(echoed):>13} {len(slim):>8} {legacy:>10.2f} {current:>11.2f} {legacy / current:>7.1f}x")
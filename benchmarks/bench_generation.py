@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backends
+import codegen
+import history_store
+import http_pool
+import prompt_templates
+import token_budget
+from language_detect import detect_language_from_prompt
+
+# End-to-end benchmark of the generate path against a local mock inference server.
+# Measures what CodeGenie adds on top of model latency, stage by stage, plus throughput.
+# Run with: python benchmarks/bench_generation.py
+#           python benchmarks/bench_generation.py --check          (fail on regressions)
+#           python benchmarks/bench_generation.py --save-baseline  (after an intended change)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_generation.json")
+
+PROMPTS = [
+    "Create a function that takes a list of numbers and returns the sum of all even numbers",
+    "Write a python script that reads a CSV with pandas and plots a histogram",
+    "Build a React component in TypeScript that renders a paginated table",
+    "Implement a linked list in C++ with insert and delete operations",
+    "Write a SQL query to select the top 5 customers from the orders table grouped by region",
+    "Create a responsive landing page with HTML and CSS using flexbox",
+]
+
+# Mock Hugging Face endpoint: answers after a fixed latency with a fenced code block of
+# the requested size. Like the real API it echoes the prompt unless told not to, continues
+# a code block the prompt opened and honours stop sequences.
+class MockInferenceHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    lines = 40
+    token_delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        parameters = body.get("parameters", {})
+        code = "\n".join(f"    value_{i} = compute({i}) * {i}  # step {i}" for i in range(self.lines))
+        answer = f"def generated():\n{code}\n```\nThis code computes the values."
+        if body["inputs"].count("```") % 2 == 0:
+            answer = "Here is the code:\n```python\n" + answer
+        for stop in parameters.get("stop", []):
+            if stop in answer:
+                answer = answer[:answer.index(stop) + len(stop)]
+        time.sleep(self.latency)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for line in answer.splitlines(keepends=True):
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                self.wfile.write(("data:" + json.dumps({"token": {"text": line, "special": False}}) + "\n\n").encode())
+            return
+
+        output = {"generated_text": answer}
+        if parameters.get("details"):
+            output["details"] = {"generated_tokens": len(answer) // 4, "finish_reason": "stop_sequence"}
+        if parameters.get("return_full_text", True):
+            output["generated_text"] = body["inputs"] + answer
+        data = json.dumps([output]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+# Function to start the mock server in the background. Returns the server.
+def start_mock_server(latency, lines, token_delay):
+    MockInferenceHandler.latency = latency
+    MockInferenceHandler.lines = lines
+    MockInferenceHandler.token_delay = token_delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockInferenceHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Function to get a percentile (0-100) of a list of samples
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[int(p / 100 * (len(ordered) - 1))]
+
+# Function to time one generation stage by stage, the way generate_code_api runs it.
+# Appends milliseconds per stage to timings and returns the response size in bytes.
+def run_stages(prompt, model_id, timings, username):
+    backend, model_name = backends.resolve(model_id)
+
+    def timed(stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    language = timed("detect_language", detect_language_from_prompt, prompt)
+    full_prompt = timed("build_prompt", codegen.build_prompt, prompt, language, model_id)
+    budget = timed("token_budget", token_budget.estimate_max_new_tokens, prompt, language, 500)
+    url, headers, payload = backend.build_request(model_name, full_prompt, budget, 0.7, codegen.DEFAULT_API_KEY,
+                                                  stream=False, stop=prompt_templates.stop_sequences(prompt))
+    body = timed("json_encode", json.dumps, payload)
+    response = timed("http", http_pool.post, url, headers=headers, data=body)
+    output = timed("json_decode", response.json)
+    code_part = timed("parse_response", backend.parse_response, output, full_prompt)
+    code = timed("extract_code", codegen.extract_code, code_part,
+                 primed=bool(prompt_templates.response_primer(prompt, language)))
+    timed("save_history", history_store.save_entry, username, prompt, language, "bench", code)
+    timed("load_history", history_store.load_entries_cached, username, limit=5)
+    return len(response.content)
+
+# Function to time full generate_code_api and stream_code_api calls
+def run_end_to_end(prompt, model_id, timings):
+    language = detect_language_from_prompt(prompt)
+    start = time.perf_counter()
+    code, error = codegen.generate_code_api(prompt, language, model_id, 500, 0.7, use_cache=False)
+    timings.setdefault("generate_total", []).append((time.perf_counter() - start) * 1000)
+    if error:
+        raise RuntimeError(error)
+
+    info = {}
+    start = time.perf_counter()
+    for _ in codegen.stream_code_api(prompt, language, model_id, 500, 0.7, use_cache=False, info=info):
+        pass
+    timings.setdefault("stream_total", []).append((time.perf_counter() - start) * 1000)
+    if info["error"]:
+        raise RuntimeError(info["error"])
+
+# Function to time reruns of the Streamlit script for a logged-in user
+def run_reruns(count, username, timings):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "app1.py"), default_timeout=60)
+    app.session_state["authenticated"] = True
+    app.session_state["username"] = username
+    app.run()  # first run pays for imports
+    for _ in range(count):
+        start = time.perf_counter()
+        app.run()
+        timings.setdefault("app_rerun", []).append((time.perf_counter() - start) * 1000)
+
+# Function to measure generations per second with several concurrent sessions
+def run_throughput(model_id, concurrency, duration):
+    stop_at = time.perf_counter() + duration
+    counts = [0] * concurrency
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.perf_counter() < stop_at:
+            prompt = rng.choice(PROMPTS)
+            _, error = codegen.generate_code_api(prompt, detect_language_from_prompt(prompt), model_id, 500, 0.7, use_cache=False)
+            if error:
+                raise RuntimeError(error)
+            counts[index] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return sum(counts) / (time.perf_counter() - start)
+
+# Function to compare p95s with the stored baseline. Returns a list of regressions.
+def check_baseline(results, tolerance):
+    with open(BASELINE_FILE, "r") as f:
+        baseline = json.load(f)
+    if baseline["settings"] != results["settings"]:
+        print(f"Warning: baseline was recorded with {baseline['settings']}")
+    regressions = []
+    for stage, expected in baseline["stages"].items():
+        if stage not in results["stages"]:
+            continue
+        measured = results["stages"][stage]["p95"]
+        # Sub-0.1ms stages are noise-dominated; give them an absolute floor
+        if measured > max(expected["p95"] * (1 + tolerance), expected["p95"] + 0.1):
+            regressions.append(f"{stage}: p95 {measured:.3f}ms, baseline {expected['p95']:.3f}ms")
+    if results["throughput"] < baseline["throughput"] / (1 + tolerance):
+        regressions.append(f"throughput: {results['throughput']:.1f}/s, baseline {baseline['throughput']:.1f}/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end generation latency benchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="mock model latency in seconds")
+    parser.add_argument("--lines", type=int, default=40, help="lines of code in each mock response")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed mock lines")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of the throughput run")
+    parser.add_argument("--reruns", type=int, default=20, help="app1.py reruns to time (0 to skip)")
+    parser.add_argument("--check", action="store_true", help="fail if slower than the stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown for --check, 0.5 = 50%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # Keep history and cache files away from the real ones
+    os.chdir(tempfile.mkdtemp(prefix="codegenie-bench-"))
+
+    server = start_mock_server(args.latency, args.lines, args.token_delay)
+    backends.HF_API_URL = f"http://127.0.0.1:{server.server_address[1]}/models/{{model_id}}"
+    model_id = "mistralai/Mistral-7B-Instruct-v0.2"
+    username = "bench"
+
+    timings = {}
+    response_bytes = []
+    for i in range(args.iterations):
+        prompt = PROMPTS[i % len(PROMPTS)]
+        response_bytes.append(run_stages(prompt, model_id, timings, username))
+        run_end_to_end(prompt, model_id, timings)
+    if args.reruns:
+        run_reruns(args.reruns, username, timings)
+    throughput = run_throughput(model_id, args.concurrency, args.duration)
+
+    results = {
+        "settings": {"latency": args.latency, "lines": args.lines, "iterations": args.iterations,
+                     "concurrency": args.concurrency},
+        "stages": {
+            stage: {"p50": percentile(samples, 50), "p95": percentile(samples, 95), "p99": percentile(samples, 99)}
+            for stage, samples in timings.items()
+        },
+        "response_bytes": sum(response_bytes) / len(response_bytes),
+        "throughput": throughput
+    }
+
+    print(f"Mock latency {args.latency * 1000:.0f}ms, {args.lines} lines per response, {args.iterations} iterations")
+    print(f"{'stage':<18} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for stage, values in results["stages"].items():
+        print(f"{stage:<18} {values['p50']:>10.3f} {values['p95']:>10.3f} {values['p99']:>10.3f}")
+    overhead = results["stages"]["generate_total"]["p50"] - args.latency * 1000
+    print(f"\nCodeGenie overhead on top of the model (p50): {overhead:.2f}ms")
+    print(f"Average response size: {results['response_bytes']:.0f} bytes")
+    print(f"Throughput with {args.concurrency} sessions: {throughput:.1f} generations/s")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+
+    if args.check:
+        regressions = check_baseline(results, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_detect import detect_language_from_prompt, detect_languages
+
+# Benchmark of detect_language_from_prompt against the previous implementation.
+# Run with: python benchmarks/bench_language_detect.py
+
+PROMPTS = [
+    "Create a function that takes a list of numbers and returns the sum of all even numbers",
+    "Write a python script that reads a CSV with pandas and plots a histogram",
+    "Build a React component in TypeScript that renders a paginated table",
+    "Implement a linked list in C++ with insert and delete operations",
+    "Write a SQL query to select the top 5 customers from the orders table grouped by region",
+    "Create a responsive landing page with HTML and CSS using flexbox",
+    "A bash script to back up my home directory on linux every night",
+    "Reverse a string in Go using a goroutine",
+    "Use dplyr and ggplot to summarise statistics in R",
+    "An async C# method that downloads a file with HttpClient",
+]
+
+# Previous implementation: rebuilds the pattern dict and searches pattern by pattern, first match wins
+def legacy_detect_language_from_prompt(prompt):
+    # Dictionary of programming languages and their related keywords/patterns
+    language_patterns = {
+        "Python": [r'\bpython\b', r'\.py\b', r'\bpip\b', r'\bdjango\b', r'\bflask\b', r'\bnumpy\b', r'\bpandas\b'],
+        "JavaScript": [r'\bjavascript\b', r'\bjs\b', r'\.js\b', r'\bnode\.js\b', r'\bnpm\b', r'\breact\b', r'\bangular\b', r'\bvue\b'],
+        "Java": [r'\bjava\b', r'\.java\b', r'\bspring\b', r'\bmaven\b', r'\bhibernate\b'],
+        "C++": [r'\bc\+\+\b', r'\.cpp\b', r'\bcmake\b', r'\bstl\b', r'\bvector<\b'],
+        "C": [r'\bc\b', r'\.c\b', r'\bpointer\b', r'\bmalloc\b', r'\bstdio\b', r'\bstdlib\b', r'\bprintf\b'],
+        "C#": [r'\bc#\b', r'\.cs\b', r'\bdotnet\b', r'\basync\b', r'\bawait\b', r'\busing\b'],
+        "Go": [r'\bgo\b', r'\bgolang\b', r'\.go\b', r'\bgoroutine\b'],
+        "Ruby": [r'\bruby\b', r'\.rb\b', r'\brails\b', r'\bgem\b'],
+        "PHP": [r'\bphp\b', r'\.php\b', r'\blaravel\b', r'\bsymphony\b'],
+        "Swift": [r'\bswift\b', r'\.swift\b', r'\bios\b', r'\bxcode\b', r'\bcocoa\b'],
+        "Kotlin": [r'\bkotlin\b', r'\.kt\b', r'\bandroid\b'],
+        "Rust": [r'\brust\b', r'\.rs\b', r'\bcargo\b', r'\bcrate\b'],
+        "TypeScript": [r'\btypescript\b', r'\bts\b', r'\.ts\b', r'\bangular\b', r'\bvue\b'],
+        "HTML": [r'\bhtml\b', r'\.html\b', r'\bhtml5\b', r'\bdiv\b', r'\bspan\b', r'\binput\b', r'\bform\b', r'\bmarkup\b'],
+        "CSS": [r'\bcss\b', r'\.css\b', r'\bstylesheet\b', r'\bstyle\b', r'\bflex\b', r'\bgrid\b', r'\bbootstrap\b'],
+        "SQL": [r'\bsql\b', r'\bmysql\b', r'\bpostgresql\b', r'\bselect\b', r'\bfrom\b', r'\bwhere\b', r'\bgroup by\b'],
+        "Shell/Bash": [r'\bbash\b', r'\bshell\b', r'\.sh\b', r'\blinux\b', r'\bunix\b', r'\bscript\b'],
+        "Perl": [r'\bperl\b', r'\.pl\b', r'\bregex\b'],
+        "R": [r'\br\b', r'\.r\b', r'\bstatistics\b', r'\bggplot\b', r'\bdplyr\b'],
+        "MATLAB": [r'\bmatlab\b', r'\.m\b', r'\bmatrix\b', r'\boctave\b']
+    }
+    
+    # Check for explicit language mentions
+    prompt_lower = prompt.lower()
+    for language, patterns in language_patterns.items():
+        for pattern in patterns:
+            if re.search(pattern, prompt_lower, re.IGNORECASE):
+                return language
+    
+    # Look for language mentions like "in Python" or "using JavaScript"
+    for language in language_patterns.keys():
+        if f"in {language.lower()}" in prompt_lower or f"using {language.lower()}" in prompt_lower:
+            return language
+        
+    # Default to Python if no language is detected
+    return "Python"
+
+
+# Function to time one detector in microseconds per call
+def time_per_call(detector, prompts, repeat=5, number=200):
+    timer = timeit.Timer(lambda: [detector(prompt) for prompt in prompts])
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / (number * len(prompts)) * 1e6
+
+if __name__ == "__main__":
+    print(f"{'prompt':<60} {'legacy':<12} {'current':<12}")
+    for prompt in PROMPTS:
+        print(f"{prompt[:58]:<60} {legacy_detect_language_from_prompt(prompt):<12} {detect_language_from_prompt(prompt):<12}")
+    print()
+
+    legacy = time_per_call(legacy_detect_language_from_prompt, PROMPTS)
+    current = time_per_call(detect_language_from_prompt, PROMPTS)
+    batch_timer = timeit.Timer(lambda: detect_languages(PROMPTS))
+    batch = min(batch_timer.repeat(repeat=5, number=200)) / (200 * len(PROMPTS)) * 1e6
+
+    print(f"legacy : {legacy:8.1f} us/call")
+    print(f"current: {current:8.1f} us/call ({legacy / current:.1f}x)")
+    print(f"batch  : {batch:8.1f} us/prompt")
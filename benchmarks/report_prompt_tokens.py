@@ -0,0 +1,124 @@
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_templates
+from codegen import build_prompt, file_extensions
+
+# Report of input tokens per prompt template, before (indented f-strings) and after
+# (compact templates from prompt_templates).
+# Run with: python benchmarks/report_prompt_tokens.py
+#           python benchmarks/report_prompt_tokens.py --tokenizer mistralai/Mistral-7B-Instruct-v0.2
+# Without --tokenizer (which needs the transformers package) tokens are estimated.
+
+MODEL_IDS = {
+    "mistral": "mistralai/Mistral-7B-Instruct-v0.2",
+    "codellama": "codellama/CodeLlama-7b-Instruct-hf",
+    "bloomz": "bigscience/bloomz-7b1",
+    "generic": "stub:generic"
+}
+PROMPTS = {
+    False: "Create a function that takes a list of numbers and returns the sum of all even numbers",
+    True: "Create a responsive landing page with HTML and CSS using flexbox"
+}
+LANGUAGES = ["Python", "JavaScript", "C++"]
+
+# Previous prompt builder, kept here for comparison
+def legacy_build_prompt(prompt, language, model_id):
+    file_ext = file_extensions.get(language, language.lower())
+    
+    # Special handling for HTML/CSS/JS combined projects
+    is_web_project = False
+    if "HTML" in prompt.upper() and "CSS" in prompt.upper():
+        is_web_project = True
+    
+    if "codellama" in model_id.lower():
+        # CodeLlama specific prompt
+        if is_web_project:
+            full_prompt = f"""
+                Write code based on this description:
+                {prompt}
+                
+                Include HTML structure, CSS styling, and JavaScript if needed.
+                Format the code properly with clear comments.
+                
+                Code:
+                
+                """
+        else:
+            full_prompt = f"""
+                Write a {language} function based on this description:
+                {prompt}
+                
+                Include necessary imports, clear comments, and format the code properly.
+                
+                {language} code:
+                {file_ext}
+                """
+    else:
+        # Generic prompt for other models
+        if is_web_project:
+            full_prompt = f"""
+                Task: Write code based on the following description.
+                Description: {prompt}
+                Requirements:
+                - Create proper HTML structure
+                - Add CSS styling
+                - Include JavaScript functionality if needed
+                - Format the code properly with clear sections
+                
+                CODE:
+                """
+        else:
+            full_prompt = f"""
+                Task: Write a {language} function based on the following description.
+                Description: {prompt}
+                Requirements:
+                - Include necessary imports
+                - Add clear comments
+                - Format the code properly
+                - Follow best practices for {language}
+                
+                {language} CODE:
+                """
+    
+    return full_prompt
+
+
+# Rough token estimate: words, punctuation and newlines count one each, and runs of
+# spaces cost one token per four spaces beyond the single space before a word
+_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]|\n| {2,}")
+
+def estimate_tokens(text):
+    count = 0
+    for piece in _ESTIMATE_RE.findall(text):
+        count += (len(piece) + 2) // 4 if piece.startswith("  ") else 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Input tokens per prompt template")
+    parser.add_argument("--tokenizer", default=None, help="Hugging Face tokenizer to count real tokens")
+    args = parser.parse_args()
+
+    count_tokens = estimate_tokens
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        count_tokens = lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+    print(f"{'template (family, language, web)':<36} {'before':>7} {'after':>7} {'saved':>7}")
+    total_before = total_after = 0
+    for family in prompt_templates.families():
+        for web in (False, True):
+            for language in (LANGUAGES if not web else ["HTML"]):
+                prompt = PROMPTS[web]
+                before = count_tokens(legacy_build_prompt(prompt, language, MODEL_IDS[family]))
+                after = count_tokens(build_prompt(prompt, language, MODEL_IDS[family]))
+                total_before += before
+                total_after += after
+                key = f"({family}, {language}, {'web' if web else 'code'})"
+                print(f"{key:<36} {before:>7} {after:>7} {(before - after) / before:>6.0%}")
+    print(f"{'total':<36} {total_before:>7} {total_after:>7} {(total_before - total_after) / total_before:>6.0%}")
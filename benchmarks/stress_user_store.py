@@ -0,0 +1,149 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Stress test of the login paths with several processes doing mixed register/login/reset
+# operations against one database, as several Streamlit servers would. Workers call the
+# functions in login.py, so every step of registration (check, then insert), login (verify,
+# rehash, last_login, token) and password reset (hash, update, revoke tokens) is covered.
+# Password hashing is made cheap through the environment so the database is the bottleneck.
+# Run with: python benchmarks/stress_user_store.py --processes 8 --ops 500
+# Exits non-zero if any write was lost.
+
+SHARED_NAMES = 50  # usernames every process races to register
+
+# Cheap hashing, unless set already; workers inherit these
+HASH_ENVIRONMENT = {
+    "CODEGENIE_HASH_TARGET_MS": "1",
+    "CODEGENIE_SCRYPT_MIN_N": "1024",
+    "CODEGENIE_PBKDF2_MIN_ITERATIONS": "1000",
+}
+
+# Function run in each worker process. Returns what the worker wrote, for the final check.
+def worker(args):
+    directory, worker_id, ops, seed = args
+    os.chdir(directory)
+    import login
+    import session_tokens
+
+    rng = random.Random(seed)
+    registered = {}   # username -> last password this worker set
+    tokens = {}       # username -> session token from the last login
+    logged_in = set()
+    shared_won = []
+    logins = 0
+    errors = []
+
+    start = time.perf_counter()
+    for i in range(ops):
+        op = rng.random()
+        try:
+            if op < 0.35 or not registered:
+                # Register a user only this worker owns
+                username = f"w{worker_id}_u{i}"
+                password = f"pw-{worker_id}-{i}-0"
+                ok, message = login.register_user(username, password, f"{username}@test")
+                if not ok:
+                    errors.append(f"register {username}: {message}")
+                else:
+                    registered[username] = password
+            elif op < 0.45:
+                # Race every other worker for a shared username
+                name = f"shared_{rng.randrange(SHARED_NAMES)}"
+                ok, _ = login.register_user(name, f"pw-{worker_id}", f"{name}@test")
+                if ok:
+                    shared_won.append(name)
+            elif op < 0.85:
+                # Login: verify the password, maybe rehash it, update last_login and get a token
+                username = rng.choice(list(registered))
+                token = login.authenticate_user(username, registered[username])
+                if token is None:
+                    errors.append(f"login {username}: rejected the current password")
+                elif session_tokens.verify_token(token) != username:
+                    errors.append(f"login {username}: issued a token that does not verify")
+                else:
+                    tokens[username] = token
+                    logged_in.add(username)
+                logins += 1
+            else:
+                # Reset: look up by email, write a new hash and log out the user's sessions
+                username = rng.choice(list(registered))
+                new_password = f"pw-{worker_id}-{i}-reset"
+                ok, message = login.reset_password(f"{username}@test", new_password)
+                if not ok:
+                    errors.append(f"reset {username}: {message}")
+                    continue
+                registered[username] = new_password
+                old_token = tokens.pop(username, None)
+                if old_token is not None and session_tokens.verify_token(old_token) is not None:
+                    errors.append(f"reset {username}: a session token survived the reset")
+        except Exception as e:
+            errors.append(f"op {i}: {e!r}")
+    elapsed = time.perf_counter() - start
+
+    return {"registered": registered, "logged_in": sorted(logged_in), "shared_won": shared_won, "logins": logins,
+            "errors": errors, "elapsed": elapsed, "ops": ops}
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process stress test of the login paths")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500, help="operations per process")
+    parser.add_argument("--dir", default=None, help="working directory (default: a new temp dir)")
+    args = parser.parse_args()
+
+    for name, value in HASH_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    directory = args.dir or tempfile.mkdtemp(prefix="codegenie-stress-")
+    print(f"Store directory: {directory}")
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(worker, [(directory, w, args.ops, w) for w in range(args.processes)])
+    wall = time.perf_counter() - start
+
+    os.chdir(directory)
+    import passwords
+    import user_store
+
+    failures = []
+    for result in results:
+        failures.extend(result["errors"])
+        for username, password in result["registered"].items():
+            user = user_store.get_user(username)
+            if user is None:
+                failures.append(f"lost registration: {username}")
+            elif not passwords.verify_password(password, user["password"])[0]:
+                failures.append(f"lost password update: {username}")
+        for username in result["logged_in"]:
+            if user_store.get_user(username)["last_login"] is None:
+                failures.append(f"lost last_login: {username}")
+
+    shared_winners = [name for result in results for name in result["shared_won"]]
+    if len(shared_winners) != len(set(shared_winners)):
+        failures.append("a shared username was registered twice")
+    stored_shared = user_store.get_connection().execute(
+        "SELECT COUNT(*) FROM users WHERE username LIKE 'shared_%'"
+    ).fetchone()[0]
+    if stored_shared != len(set(shared_winners)):
+        failures.append(f"shared users: {stored_shared} stored, {len(set(shared_winners))} reported")
+
+    total_ops = sum(result["ops"] for result in results)
+    print(f"Processes: {args.processes}, operations: {total_ops}, wall time: {wall:.2f}s")
+    print(f"Throughput: {total_ops / wall:.0f} ops/s")
+    print(f"Users stored: {user_store.count_users()}, logins: {sum(r['logins'] for r in results)}")
+
+    if failures:
+        print(f"FAILED: {len(failures)} problem(s)")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("OK: no lost writes")
+
+if __name__ == "__main__":
+    main()
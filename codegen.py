@@ -0,0 +1,584 @@
+import re
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+import backends
+import generation_cache
+import metrics
+import prompt_templates
+import retry_policy
+import scheduler
+import singleflight
+import token_budget
+
+# Pre-configured API key (embedded for hackathon purposes)
+DEFAULT_API_KEY = "api-key"
+
+# Define file extensions dictionary - used by the app for download file names
+file_extensions = {
+    "Python": "py", "JavaScript": "js", "Java": "java", "C++": "cpp", 
+    "C": "c", "C#": "cs", "Go": "go", "Ruby": "rb", "PHP": "php",
+    "Swift": "swift", "Kotlin": "kt", "Rust": "rs", "TypeScript": "ts",
+    "HTML": "html", "CSS": "css", "SQL": "sql", "Shell/Bash": "sh",
+    "Perl": "pl", "R": "r", "MATLAB": "m"
+}
+
+# Shared worker pool for comparing several models at once
+COMPARE_WORKERS = int(os.environ.get("CODEGENIE_COMPARE_WORKERS", "8"))
+_compare_executor = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix="codegenie-compare")
+
+# Recent time-to-first-token samples of streamed generations, in seconds
+_ttft_samples = deque(maxlen=200)
+_stream_lock = threading.Lock()
+_stream_stats = {"streams": 0, "errors": 0}
+
+# Hedging: when the primary model is slower than this percentile of its recent latency,
+# the same prompt is also sent to a fallback model and the first answer wins
+HEDGE_PERCENTILE = float(os.environ.get("CODEGENIE_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("CODEGENIE_HEDGE_MIN_SAMPLES", "5"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("CODEGENIE_HEDGE_DEFAULT_DELAY", "10"))  # seconds, until enough samples exist
+_hedge_executor = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix="codegenie-hedge")
+
+# Recent successful generation times per model, in seconds
+_latency_samples = {}
+_hedge_lock = threading.Lock()
+_hedge_stats = {"hedged_requests": 0, "hedges_fired": 0, "primary_wins": 0, "fallback_wins": 0, "both_failed": 0,
+               "legs_cancelled": 0}
+
+# Function to construct the full prompt based on the model and language (see prompt_templates)
+@metrics.timed("build_prompt")
+def build_prompt(prompt, language, model_id):
+    return prompt_templates.render(prompt, language, model_id)
+
+# Patterns used on every response, compiled once
+_FENCE = "```"
+_FENCE_HEADER_RE = re.compile(r'\w*\n')  # language identifier line after an opening fence
+_WORD_RE = re.compile(r'\w*')
+_LANGUAGE_ID_RE = re.compile(r'^(?:python|javascript|java|cpp|c\+\+|c#|csharp|c|go|ruby|php|swift|kotlin|rust|typescript|html|css|sql|bash|perl|r|matlab)\n', re.IGNORECASE)
+# A primed answer continues a block the prompt opened and tagged (see
+# prompt_templates.response_primer); an untagged fence starts extraction inside it
+_PRIMED_OPENING = _FENCE + "\n"
+
+# Function to extract the code from the generated text.
+# One left-to-right pass over the fences: every closed block is kept (joined by a blank
+# line); with an unterminated block, everything after the opening fence is kept.
+# primed=True means code_part is the answer to a primed prompt and starts inside a block.
+@metrics.timed("extract_code")
+def extract_code(code_part, primed=False):
+    if primed:
+        code_part = _PRIMED_OPENING + code_part
+    blocks = []
+    first = code_part.find(_FENCE)
+    start = first
+    while start != -1:
+        header = _FENCE_HEADER_RE.match(code_part, start + 3)
+        body = header.end() if header else start + 3
+        end = code_part.find(_FENCE, body)
+        if end == -1:
+            break
+        blocks.append(code_part[body:end])
+        start = code_part.find(_FENCE, end + 3)
+    
+    if blocks:
+        # Join multiple code blocks if present
+        code_part = "\n\n".join(blocks)
+    elif first != -1:
+        # No closing fence: take the content after the opening one
+        code_part = code_part[first + 3:].strip()
+    
+    # Remove language identifier if it appears at the beginning of the code
+    code_part = _LANGUAGE_ID_RE.sub('', code_part, count=1)
+    
+    return code_part.strip()
+
+# Incremental version of extract_code for streamed output.
+# Feed it text chunks as they arrive; code() returns what can be shown so far.
+# primed is as for extract_code.
+class FencedCodeExtractor:
+    def __init__(self, primed=False):
+        self.text = ""
+        self.fenced = False
+        self._pos = 0
+        self._prose = []
+        self._blocks = []
+        self._current = None
+        self._header = None
+        self._first = None
+        if primed:
+            self.feed(_PRIMED_OPENING)
+
+    # Function to add a chunk of generated text and return the code so far
+    def feed(self, chunk):
+        self.text += chunk
+        self._scan(final=False)
+        return self.code()
+
+    # Function to flush the remaining text once the stream has ended
+    def finish(self):
+        self._scan(final=True)
+        if self._current is not None:
+            if self._blocks:
+                # Like extract_code, an unterminated block only counts when no block was closed
+                self._current = None
+            else:
+                # ...and then it is everything after the opening fence, identifier line included
+                self._current = [self.text[self._first + 3:].strip()]
+            self._header = None
+        return self.code()
+
+    # Function to return the code extracted so far
+    def code(self):
+        if self.fenced:
+            blocks = list(self._blocks)
+            if self._current is not None:
+                blocks.append("".join(self._current))
+            code_part = "\n\n".join(blocks)
+        else:
+            code_part = "".join(self._prose)
+        code_part = _LANGUAGE_ID_RE.sub('', code_part, count=1)
+        return code_part.strip()
+
+    def _scan(self, final):
+        while True:
+            fence = self.text.find("```", self._pos)
+            if fence == -1:
+                # Hold back the last two characters in case a fence is split across chunks
+                end = len(self.text) if final else max(self._pos, len(self.text) - 2)
+                self._consume(self.text[self._pos:end])
+                self._pos = end
+                return
+            self._consume(self.text[self._pos:fence])
+            self._pos = fence + 3
+            if not self.fenced:
+                self._first = fence
+            self.fenced = True
+            if self._current is None:
+                # Opening fence, possibly followed by a language identifier line
+                self._current = []
+                self._header = ""
+            else:
+                # Closing fence
+                if self._header is not None:
+                    self._current.append(self._header)
+                    self._header = None
+                self._blocks.append("".join(self._current))
+                self._current = None
+
+    def _consume(self, segment):
+        if not segment:
+            return
+        if self._current is None:
+            if not self.fenced:
+                self._prose.append(segment)
+            return
+        if self._header is None:
+            self._current.append(segment)
+            return
+        # Drop a "\w*\n" identifier line right after the opening fence
+        self._header += segment
+        match = _FENCE_HEADER_RE.match(self._header)
+        if match:
+            self._current.append(self._header[match.end():])
+            self._header = None
+        elif not _WORD_RE.fullmatch(self._header):
+            self._current.append(self._header)
+            self._header = None
+
+# Function to remember how long a model took to answer
+def _record_latency(model_id, seconds):
+    with _hedge_lock:
+        _latency_samples.setdefault(model_id, deque(maxlen=200)).append(seconds)
+
+# Function to get how long to wait for a model before hedging
+def hedge_delay(model_id):
+    with _hedge_lock:
+        samples = sorted(_latency_samples.get(model_id, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return samples[int(HEDGE_PERCENTILE / 100 * (len(samples) - 1))]
+
+# Function to record the tokens a generation used, estimating them when the backend did not say
+def _record_tokens(info, language, generated_text, max_length, budget_retry=False):
+    if info.get("tokens") is None:
+        info["tokens"] = token_budget.estimate_tokens(generated_text)
+    token_budget.record_usage(language, info["tokens"], info["max_new_tokens"], max_length,
+                              info.get("finish_reason"), budget_retry)
+
+# Function to count a finished generation in the metrics
+def _count_generation(model_id, info, error):
+    metrics.inc("codegenie_generation_requests_total", model_id)
+    if error:
+        metrics.inc("codegenie_generation_errors_total", model_id)
+    if info.get("cache_hit"):
+        metrics.inc("codegenie_cache_hits_total", model_id)
+    # A coalesced request copies the retries of the call it shared
+    if info.get("retries") and not info.get("coalesced"):
+        metrics.inc("codegenie_retries_total", model_id, info["retries"])
+
+# Function to describe why a request was turned away by the per-user rate limit
+def rate_limit_error(wait):
+    return f"You are generating too quickly, please try again in {max(1, round(wait))}s"
+
+# Function to collect the sampling parameters that, with the prompt, identify a generation
+def generation_parameters(max_length, temperature):
+    return {
+        "max_new_tokens": max_length,
+        "temperature": temperature,
+        "top_p": 0.95,
+        "do_sample": True
+    }
+
+# Function to look up a request in the generation cache.
+# Returns (cache key, cached code or None); the key is None when the cache is bypassed.
+def _cache_lookup(model_id, language, full_prompt, parameters, use_cache):
+    if not use_cache:
+        return None, None
+    key = generation_cache.make_key(model_id, language, full_prompt, parameters)
+    return key, generation_cache.get(key)
+
+# Function to generate code with the backend the model_id points at (see backends).
+# Identical requests are answered from the generation cache unless use_cache is False.
+# Rate limits, cold starts and gateway errors are retried within a total deadline (see
+# retry_policy); whether the cache answered and how many retries were needed are stored
+# in the optional info dict. Concurrent identical requests share one upstream call (see
+# singleflight); other calls go through the fair-share scheduler, which rate limits each
+# username and queues calls over the global cap. on_queue(position, estimated seconds) is
+# called while this request waits in that queue. With a fallback_model_id the request is
+# hedged: see _generate_hedged.
+def generate_code_api(prompt, language, model_id, max_length, temperature, api_key=DEFAULT_API_KEY, use_cache=True, info=None,
+                      fallback_model_id=None, username=None, on_queue=None):
+    if info is None:
+        info = {}
+    if fallback_model_id and fallback_model_id != model_id:
+        # Each finished leg is counted in the metrics as a generation of its own; a leg
+        # cancelled because the other one won is counted as a hedge cancellation
+        return _generate_hedged(prompt, language, model_id, fallback_model_id, max_length, temperature, api_key, use_cache, info,
+                                username)
+    code, error = _generate_single(prompt, language, model_id, max_length, temperature, api_key, use_cache, info,
+                                   username, on_queue)
+    _count_generation(model_id, info, error)
+    return code, error
+
+# Function to run one generation for generate_code_api
+def _generate_single(prompt, language, model_id, max_length, temperature, api_key, use_cache, info, username, on_queue):
+    info.update({"cache_hit": False, "coalesced": False, "retries": 0, "retry_wait": 0.0, "queue_wait": 0.0,
+                 "model_id": model_id, "tokens": None, "finish_reason": None})
+    
+    # One total deadline for the whole generation: queueing, retries and the budget retry
+    deadline = retry_policy.new_deadline()
+    
+    # Backend that serves this model
+    backend, model_name = backends.resolve(model_id)
+    
+    # Construct the full prompt based on the model and language
+    full_prompt = build_prompt(prompt, language, model_id)
+    
+    # Size the token budget to the request and stop once the code block is closed
+    budget = token_budget.estimate_max_new_tokens(prompt, language, max_length)
+    stop = prompt_templates.stop_sequences(prompt)
+    info["max_new_tokens"] = budget
+    
+    # Serve repeated requests without touching the network
+    cache_key, cached_code = _cache_lookup(model_id, language, full_prompt,
+                                           generation_parameters(max_length, temperature), use_cache)
+    if cached_code is not None:
+        info["cache_hit"] = True
+        return cached_code, None
+    
+    rate_wait = scheduler.take_token(username)
+    if rate_wait:
+        return None, rate_limit_error(rate_wait)
+    
+    # Runs the upstream request; its details go into a dict of their own so that
+    # callers coalesced onto it can copy them
+    def request():
+        details = {"retries": 0, "retry_wait": 0.0, "queue_wait": 0.0, "tokens": None, "finish_reason": None,
+                   "max_new_tokens": budget}
+        ticket, error = scheduler.acquire(username, on_wait=on_queue)
+        if error:
+            return None, error, details
+        details["queue_wait"] = scheduler.queue_wait(ticket)
+        try:
+            # Make the request, retrying transient failures
+            code_part, error = backend.complete(model_name, full_prompt, budget, temperature, api_key, details,
+                                                deadline=deadline, stop=stop)
+            if error:
+                return None, error, details
+            
+            details["budget_retry"] = details["finish_reason"] == "length" and budget < max_length
+            if details["budget_retry"]:
+                # The estimate was too small and the code got cut off: run again with the full cap
+                details["max_new_tokens"] = max_length
+                code_part, error = backend.complete(model_name, full_prompt, max_length, temperature, api_key, details,
+                                                    deadline=deadline, stop=stop)
+                if error:
+                    return None, error, details
+        finally:
+            scheduler.release(ticket)
+        _record_tokens(details, language, code_part, max_length, details["budget_retry"])
+        
+        # The answer continues the code block the prompt opened
+        code = extract_code(code_part, primed=bool(prompt_templates.response_primer(prompt, language)))
+        # Code cut off at the token limit is returned, but not served again to later requests
+        if cache_key is not None and details["finish_reason"] != "length":
+            generation_cache.put(cache_key, model_id, language, code)
+        return code, None, details
+    
+    start = time.perf_counter()
+    try:
+        if cache_key is None:
+            code, error, details = request()
+        else:
+            # The cache key covers everything sent upstream, so it also identifies the request in flight
+            (code, error, details), leader = singleflight.do(cache_key, request)
+            info["coalesced"] = not leader
+        for key in ("retries", "retry_wait", "queue_wait", "tokens", "finish_reason", "max_new_tokens"):
+            info[key] = details[key]
+        if error:
+            return None, error
+        _record_latency(model_id, time.perf_counter() - start - info["queue_wait"])
+        return code, None
+    
+    except Exception as e:
+        return None, f"Error making API request: {str(e)}"
+
+# Function to stream generated code from the model's backend.
+# Yields the code extracted so far after every token; the final code, any error,
+# the time to first token (seconds), whether the cache answered and the number of retries
+# are stored in the info dict. Only the opening request is retried; a stream that breaks
+# after tokens have been shown is reported as an error. Setting the optional cancel event
+# drops the connection at the next token, which stops the generation upstream (once no
+# coalesced request is still reading it, see singleflight). username and on_queue are as
+# for generate_code_api.
+def stream_code_api(prompt, language, model_id, max_length, temperature, api_key=DEFAULT_API_KEY, use_cache=True, info=None,
+                    cancel=None, username=None, on_queue=None):
+    if info is None:
+        info = {}
+    return _stream_generation(prompt, language, model_id, max_length, temperature, api_key, use_cache, info, cancel,
+                              username, on_queue, counted=True)
+
+# Function to run a streamed generation for stream_code_api. With counted=False it leaves
+# the stream counters and generation metrics to the caller (hedge legs are not streams the
+# user sees, and a cancelled losing leg is not a failed generation).
+def _stream_generation(prompt, language, model_id, max_length, temperature, api_key, use_cache, info, cancel, username,
+                       on_queue, counted):
+    info.update({"code": None, "error": None, "ttft": None, "total_time": None, "cache_hit": False, "coalesced": False,
+                 "retries": 0, "retry_wait": 0.0, "queue_wait": 0.0, "model_id": model_id, "tokens": None,
+                 "finish_reason": None})
+    
+    backend, model_name = backends.resolve(model_id)
+    full_prompt = build_prompt(prompt, language, model_id)
+    # A stream cannot be retried once its tokens are shown, so it is sent with the full
+    # limit; the closing-fence stop sequence still ends it as soon as the code is done
+    stop = prompt_templates.stop_sequences(prompt)
+    info["max_new_tokens"] = max_length
+    
+    start = time.perf_counter()
+    cache_key, cached_code = _cache_lookup(model_id, language, full_prompt,
+                                           generation_parameters(max_length, temperature), use_cache)
+    if cached_code is not None:
+        info.update({"code": cached_code, "cache_hit": True, "total_time": time.perf_counter() - start})
+        if counted:
+            _count_generation(model_id, info, None)
+        yield cached_code
+        return
+    
+    rate_wait = scheduler.take_token(username)
+    if rate_wait:
+        info.update({"error": rate_limit_error(rate_wait), "total_time": time.perf_counter() - start})
+        if counted:
+            _count_generation(model_id, info, info["error"])
+        return
+    
+    if counted:
+        with _stream_lock:
+            _stream_stats["streams"] += 1
+    
+    deadline = retry_policy.new_deadline()
+    
+    # Streams from the backend once the scheduler gives this request a slot
+    def upstream(upstream_info, upstream_cancel, on_wait):
+        ticket, upstream_info["error"] = scheduler.acquire(username, on_wait=on_wait, cancel=upstream_cancel)
+        if ticket is None:
+            return
+        upstream_info["queue_wait"] = scheduler.queue_wait(ticket)
+        try:
+            yield from backend.stream(model_name, full_prompt, max_length, temperature, api_key, upstream_info,
+                                      deadline=deadline, cancel=upstream_cancel, stop=stop)
+        finally:
+            scheduler.release(ticket)
+    
+    # Passes on the queue position of the request being read, until it gets a slot
+    def relay_queue(flight_info):
+        if on_queue is not None and "queue_wait" not in flight_info and flight_info.get("queue_position"):
+            on_queue(flight_info["queue_position"], flight_info["queue_eta"])
+    
+    try:
+        extractor = FencedCodeExtractor(primed=bool(prompt_templates.response_primer(prompt, language)))
+        generated = []
+        extract_time = 0.0
+        upstream_info, leader = info, True
+        if cache_key is None:
+            chunks = upstream(info, cancel, on_queue)
+        else:
+            # Concurrent identical requests read the same upstream stream; it is only
+            # cancelled once all of them have stopped reading
+            chunks, upstream_info, leader = singleflight.stream(
+                cache_key,
+                lambda flight_info, flight_cancel: upstream(
+                    flight_info, flight_cancel,
+                    lambda position, eta: flight_info.update({"queue_position": position, "queue_eta": eta})),
+                on_idle=relay_queue, cancel=cancel)
+            info["coalesced"] = not leader
+        # closing() drops the connection as soon as we stop reading
+        with closing(chunks):
+            for text in chunks:
+                if cancel is not None and cancel.is_set():
+                    info["error"] = "Request cancelled"
+                    break
+                if time.monotonic() > deadline:
+                    info["error"] = f"Generation deadline of {retry_policy.DEADLINE:.0f}s exceeded while streaming"
+                    break
+                if info["ttft"] is None:
+                    info["ttft"] = time.perf_counter() - start
+                    if counted:
+                        with _stream_lock:
+                            _ttft_samples.append(info["ttft"])
+                generated.append(text)
+                feed_start = time.perf_counter()
+                partial_code = extractor.feed(text)
+                extract_time += time.perf_counter() - feed_start
+                yield partial_code
+        if cancel is not None and cancel.is_set():
+            # Also covers a request cancelled before its first token, e.g. while queued
+            info["error"] = "Request cancelled"
+        if upstream_info is not info:
+            info["error"] = info["error"] or upstream_info.get("error")
+            for key in ("retries", "retry_wait", "queue_wait", "tokens", "finish_reason"):
+                if key in upstream_info:
+                    info[key] = upstream_info[key]
+        if not info["error"]:
+            feed_start = time.perf_counter()
+            info["code"] = extractor.finish()
+            # Extraction is spread over the tokens; it counts as one stage of the generation
+            metrics.observe("extract_code", extract_time + time.perf_counter() - feed_start)
+            _record_latency(model_id, time.perf_counter() - start - info["queue_wait"])
+            if leader:
+                _record_tokens(info, language, "".join(generated), max_length)
+                if cache_key is not None and info["finish_reason"] != "length":
+                    generation_cache.put(cache_key, model_id, language, info["code"])
+    except Exception as e:
+        info["error"] = f"Error making API request: {str(e)}"
+    
+    info["total_time"] = time.perf_counter() - start
+    if counted:
+        _count_generation(model_id, info, info["error"])
+        if info["error"]:
+            with _stream_lock:
+                _stream_stats["errors"] += 1
+
+# Function to run one leg of a hedged request to completion, streaming so it can be cancelled.
+# A leg cancelled because the other one won counts as a hedge cancellation, not as a failure.
+def _hedge_leg(prompt, language, model_id, max_length, temperature, api_key, use_cache, cancel, username):
+    info = {}
+    for _ in _stream_generation(prompt, language, model_id, max_length, temperature, api_key, use_cache, info, cancel,
+                                username, None, counted=False):
+        pass
+    if info["error"] and cancel.is_set():
+        metrics.inc("codegenie_hedge_cancellations_total", model_id)
+        with _hedge_lock:
+            _hedge_stats["legs_cancelled"] += 1
+    else:
+        _count_generation(model_id, info, info["error"])
+    return info
+
+# Function to generate with the primary model and, if it has not answered within
+# hedge_delay(model_id), also with the fallback model. The first successful answer is
+# returned and the other request is cancelled. info records whether the hedge fired
+# ("hedged") and which model won ("model_id", "winner" is "primary" or "fallback").
+def _generate_hedged(prompt, language, model_id, fallback_model_id, max_length, temperature, api_key, use_cache, info,
+                     username=None):
+    with _hedge_lock:
+        _hedge_stats["hedged_requests"] += 1
+    delay = hedge_delay(model_id)
+    info.update({"cache_hit": False, "retries": 0, "retry_wait": 0.0, "queue_wait": 0.0, "hedged": False, "hedge_delay": delay})
+
+    cancels = {"primary": threading.Event(), "fallback": threading.Event()}
+    primary = _hedge_executor.submit(_hedge_leg, prompt, language, model_id, max_length, temperature,
+                                     api_key, use_cache, cancels["primary"], username)
+    legs = {primary: "primary"}
+
+    # Hedge when the primary is slow, or has already failed
+    done, _ = wait([primary], timeout=delay)
+    if not done or primary.result()["error"]:
+        info["hedged"] = True
+        with _hedge_lock:
+            _hedge_stats["hedges_fired"] += 1
+        fallback = _hedge_executor.submit(_hedge_leg, prompt, language, fallback_model_id, max_length, temperature,
+                                          api_key, use_cache, cancels["fallback"], username)
+        legs[fallback] = "fallback"
+
+    # Take the first leg that succeeds; if one fails, keep waiting for the other
+    pending = set(legs)
+    winner, result = None, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if not future.result()["error"] and winner is None:
+                winner, result = legs[future], future.result()
+        if winner is not None:
+            break
+        result = result or next(iter(done)).result()
+    for role, cancel in cancels.items():
+        if role != winner:
+            cancel.set()
+
+    for key in ("cache_hit", "coalesced", "retries", "retry_wait", "queue_wait", "model_id", "tokens", "finish_reason", "max_new_tokens"):
+        info[key] = result.get(key)
+    info["winner"] = winner
+    with _hedge_lock:
+        if winner is None:
+            _hedge_stats["both_failed"] += 1
+        else:
+            _hedge_stats[f"{winner}_wins"] += 1
+    return result["code"], result["error"]
+
+# Function to report hedging counters and the current hedge delay per model
+def hedge_stats():
+    with _hedge_lock:
+        stats = dict(_hedge_stats)
+        models = list(_latency_samples)
+    stats["percentile"] = HEDGE_PERCENTILE
+    stats["hedge_delay"] = {model: hedge_delay(model) for model in models}
+    return stats
+
+# Function to run generate_code_api against several models concurrently.
+# Yields (model_id, code, error, info) in completion order, so the caller can show
+# each result as soon as it is ready; info includes the model's elapsed time in seconds.
+def generate_code_multi(prompt, language, model_ids, max_length, temperature, api_key=DEFAULT_API_KEY, use_cache=True,
+                        username=None):
+    def run(model_id):
+        info = {}
+        start = time.perf_counter()
+        code, error = generate_code_api(prompt, language, model_id, max_length, temperature, api_key,
+                                        use_cache=use_cache, info=info, username=username)
+        info["elapsed"] = time.perf_counter() - start
+        return model_id, code, error, info
+
+    futures = [_compare_executor.submit(run, model_id) for model_id in model_ids]
+    for future in as_completed(futures):
+        yield future.result()
+
+# Function to report streaming counters and time-to-first-token percentiles
+def stream_stats():
+    with _stream_lock:
+        stats = dict(_stream_stats)
+        samples = sorted(_ttft_samples)
+    if samples:
+        stats["ttft_p50"] = samples[int(0.50 * (len(samples) - 1))]
+        stats["ttft_p95"] = samples[int(0.95 * (len(samples) - 1))]
+    return stats
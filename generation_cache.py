@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from storage import thread_connection, write_transaction
+
+# Location and limits of the generation cache, overridable through the environment
+CACHE_DIR = os.environ.get("CODEGENIE_GEN_CACHE_DIR", "cache")
+CACHE_DB = os.path.join(CACHE_DIR, "generation_cache.db")
+CACHE_TTL = float(os.environ.get("CODEGENIE_GEN_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+CACHE_MAX_BYTES = int(os.environ.get("CODEGENIE_GEN_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Eviction only needs a rough order, so a hit refreshes last_access at most this often (seconds)
+ACCESS_RESOLUTION = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    code TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_generations_last_access ON generations (last_access);
+"""
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+
+# Function to get this thread's connection to the cache
+def get_connection():
+    return thread_connection(CACHE_DB, _SCHEMA)
+
+# Function to build the cache key of a generation request
+def make_key(model_id, language, full_prompt, parameters):
+    material = json.dumps(
+        {"model_id": model_id, "language": language, "prompt": full_prompt, "parameters": parameters},
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+# Function to look up cached code. Returns None on a miss or an expired entry.
+# The lookup is a plain read, which under WAL takes no lock, so lookups from every session
+# and process run side by side and never wait for put(). Only a hit writes, to refresh the
+# entry's last_access for LRU eviction, and at most once per ACCESS_RESOLUTION seconds.
+def get(key):
+    now = time.time()
+    conn = get_connection()
+    row = conn.execute("SELECT code, size, created_at, last_access FROM generations WHERE key = ?", (key,)).fetchone()
+    if row is not None and now - row[2] > CACHE_TTL:
+        # put() deletes expired entries
+        row = None
+    if row is not None and now - row[3] > ACCESS_RESOLUTION:
+        with write_transaction(conn):
+            conn.execute("UPDATE generations SET last_access = ? WHERE key = ?", (now, key))
+
+    with _stats_lock:
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        _stats["bytes_saved"] += row[1]
+    return row[0]
+
+# Function to store generated code, then evict expired and least recently used entries
+def put(key, model_id, language, code):
+    now = time.time()
+    size = len(code.encode("utf-8"))
+    conn = get_connection()
+    with write_transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO generations (key, model_id, language, code, size, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model_id, language, code, size, now, now)
+        )
+        evicted = conn.execute("DELETE FROM generations WHERE created_at < ?", (now - CACHE_TTL,)).rowcount
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+        if total > CACHE_MAX_BYTES:
+            for old_key, old_size in conn.execute(
+                "SELECT key, size FROM generations ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM generations WHERE key = ?", (old_key,))
+                total -= old_size
+                evicted += 1
+
+    if evicted:
+        with _stats_lock:
+            _stats["evictions"] += evicted
+
+# Function to report cache hit rate, bytes saved and current size
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+    conn = get_connection()
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations").fetchone()
+    stats["entries"] = entries
+    stats["bytes"] = size
+    stats["max_bytes"] = CACHE_MAX_BYTES
+    stats["ttl_seconds"] = CACHE_TTL
+    return stats
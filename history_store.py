@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+import metrics
+from storage import thread_connection, write_transaction
+
+# Location of the history store. The legacy per-file history lives in the same directory.
+HISTORY_DIR = "history"
+HISTORY_DB = os.path.join(HISTORY_DIR, "history.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    language TEXT NOT NULL,
+    model TEXT,
+    code TEXT NOT NULL,
+    source_file TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_history_user_time ON history (username, timestamp DESC, id DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Per-user cache of history queries: {username: {query key: (signature, result)}}
+_cache = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+# Function to get this thread's connection to the history store
+def get_connection():
+    return thread_connection(HISTORY_DB, _SCHEMA, sqlite3.Row)
+
+# Function to save a generated snippet for a user
+@metrics.timed("save_history")
+def save_entry(username, prompt, language, model, code, timestamp=None):
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = get_connection()
+    with write_transaction(conn):
+        cursor = conn.execute(
+            "INSERT INTO history (username, timestamp, prompt, language, model, code) VALUES (?, ?, ?, ?, ?, ?)",
+            (username, timestamp, prompt, language, model, code)
+        )
+    invalidate_cache(username)
+    return cursor.lastrowid
+
+# Function to load a user's history, newest first. Only the requested page is read.
+# With include_code=False the code bodies are left out; fetch them with load_code().
+def load_entries(username, limit=None, offset=0, include_code=True):
+    columns = "id, username, timestamp, prompt, language, model"
+    if include_code:
+        columns += ", code"
+    conn = get_connection()
+    rows = conn.execute(
+        f"SELECT {columns} FROM history "
+        "WHERE username = ? ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+        (username, -1 if limit is None else limit, offset)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+# Function to count a user's history entries
+def count_entries(username):
+    conn = get_connection()
+    return conn.execute("SELECT COUNT(*) FROM history WHERE username = ?", (username,)).fetchone()[0]
+
+# Function to load the code of a single entry owned by a user
+def load_code(entry_id, username):
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT code FROM history WHERE id = ? AND username = ?", (entry_id, username)
+    ).fetchone()
+    return row["code"] if row is not None else ""
+
+# Function to get the on-disk signature of the history store.
+# Writes from other processes change the mtime or size of one of these files.
+def history_signature():
+    signature = []
+    for path in (HISTORY_DIR, HISTORY_DB, HISTORY_DB + "-wal"):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+# Function to look up a cached result for a user, computing it on a miss.
+# The cached value is reused until this user saves or the store changes on disk.
+def _cached(username, key, loader):
+    signature = history_signature()
+    with _cache_lock:
+        cached = _cache.get(username, {}).get(key)
+        if cached is not None and cached[0] == signature:
+            _cache_stats["hits"] += 1
+            return cached[1]
+        _cache_stats["misses"] += 1
+
+    value = loader()
+    with _cache_lock:
+        _cache.setdefault(username, {})[key] = (signature, value)
+    return value
+
+# Function to load a page of a user's history through the cache
+@metrics.timed("load_history")
+def load_entries_cached(username, limit=None, offset=0, include_code=True):
+    return _cached(
+        username, ("entries", limit, offset, include_code),
+        lambda: load_entries(username, limit=limit, offset=offset, include_code=include_code)
+    )
+
+# Function to count a user's history entries through the cache
+def count_entries_cached(username):
+    return _cached(username, ("count",), lambda: count_entries(username))
+
+# Function to drop the cached history of one user, or of everyone
+def invalidate_cache(username=None):
+    with _cache_lock:
+        if username is None:
+            _cache.clear()
+        else:
+            _cache.pop(username, None)
+        _cache_stats["invalidations"] += 1
+
+# Function to report history cache counters
+def cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["users"] = len(_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+# Function to parse one legacy code_*.txt history file
+def parse_legacy_file(path):
+    with open(path, "r") as f:
+        content = f.read()
+
+    entry = {"prompt": "", "language": "", "timestamp": "", "username": "", "model": None, "code": ""}
+    lines = content.split("\n")
+    for i, line in enumerate(lines):
+        if line.startswith("Prompt:"):
+            entry["prompt"] = line[len("Prompt:"):].strip()
+        elif line.startswith("Language:"):
+            entry["language"] = line[len("Language:"):].strip()
+        elif line.startswith("Timestamp:"):
+            entry["timestamp"] = line[len("Timestamp:"):].strip()
+        elif line.startswith("User:"):
+            entry["username"] = line[len("User:"):].strip()
+        elif line.startswith("Model:"):
+            entry["model"] = line[len("Model:"):].strip()
+        elif line.startswith("--- Generated Code ---"):
+            entry["code"] = "\n".join(lines[i+2:])
+            break
+    return entry
+
+# Function to import the legacy per-file history into the store.
+# Files are keyed by name, so running it again never duplicates entries.
+def migrate_legacy_history(history_dir=HISTORY_DIR):
+    if not os.path.exists(history_dir):
+        return 0
+
+    conn = get_connection()
+    migrated = 0
+    with write_transaction(conn):
+        for file in sorted(os.listdir(history_dir)):
+            if not (file.startswith("code_") and file.endswith(".txt")):
+                continue
+            entry = parse_legacy_file(os.path.join(history_dir, file))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO history (username, timestamp, prompt, language, model, code, source_file) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry["username"], entry["timestamp"], entry["prompt"], entry["language"],
+                 entry["model"], entry["code"], file)
+            )
+            migrated += cursor.rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', '1')")
+    invalidate_cache()
+    return migrated
+
+# Function to run the legacy migration once per history store
+def migrate_legacy_history_once(history_dir=HISTORY_DIR):
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'legacy_migrated'").fetchone()
+    if row is not None:
+        return 0
+    return migrate_legacy_history(history_dir)
+
+# Run `python history_store.py migrate` to import the legacy text files by hand
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        count = migrate_legacy_history()
+        print(f"Migrated {count} history file(s) into {HISTORY_DB}")
+    else:
+        print("Usage: python history_store.py migrate")
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool settings, overridable through the environment
+POOL_CONNECTIONS = int(os.environ.get("CODEGENIE_HTTP_POOL_CONNECTIONS", "4"))  # hosts kept in the pool
+POOL_MAXSIZE = int(os.environ.get("CODEGENIE_HTTP_POOL_MAXSIZE", "16"))  # keep-alive connections per host
+POOL_BLOCK = os.environ.get("CODEGENIE_HTTP_POOL_BLOCK", "1") == "1"  # wait for a free connection instead of exceeding POOL_MAXSIZE
+CONNECT_TIMEOUT = float(os.environ.get("CODEGENIE_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("CODEGENIE_HTTP_READ_TIMEOUT", "120"))
+
+# One session for the whole process, shared by every Streamlit session
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "total_seconds": 0.0}
+
+# Function to get the process-wide pooled HTTP session
+def get_session():
+    global _session, _adapter
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                pool_block=POOL_BLOCK
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _adapter = adapter
+            _session = session
+    return _session
+
+# Function to get the default (connect, read) timeout
+def request_timeout():
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Function to send a request through the pool, with default timeouts and usage counters
+def request(method, url, **kwargs):
+    kwargs.setdefault("timeout", request_timeout())
+    session = get_session()
+
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+
+    start = time.perf_counter()
+    try:
+        return session.request(method, url, **kwargs)
+    except requests.RequestException:
+        with _stats_lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+            _stats["total_seconds"] += time.perf_counter() - start
+
+# Function to send a POST request through the pool
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+# Function to report pool settings, request counters and per-host connection usage
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pool_connections"] = POOL_CONNECTIONS
+    stats["pool_maxsize"] = POOL_MAXSIZE
+    stats["pool_block"] = POOL_BLOCK
+    stats["connect_timeout"] = CONNECT_TIMEOUT
+    stats["read_timeout"] = READ_TIMEOUT
+
+    hosts = {}
+    if _adapter is not None:
+        pools = _adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # Unused slots in the queue are None; the rest are idle keep-alive connections
+            queued = list(pool.pool.queue) if pool.pool is not None else []
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": sum(1 for conn in queued if conn is not None),
+                "in_use": pool.pool.maxsize - len(queued) if pool.pool is not None else 0
+            }
+    stats["hosts"] = hosts
+    return stats
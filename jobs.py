@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import history_store
+import metrics
+from codegen import DEFAULT_API_KEY, generate_code_api, generate_code_multi, stream_code_api
+
+# Background generation jobs. The Generate button submits a job here and the page polls it,
+# so the script thread is free while the model works: the user can browse history, and
+# reruns do not abandon the request. A finished job is saved to its user's history by the
+# worker, whether or not anyone is still watching it.
+JOB_WORKERS = int(os.environ.get("CODEGENIE_JOB_WORKERS", "16"))
+JOB_TTL = float(os.environ.get("CODEGENIE_JOB_TTL", "3600"))  # seconds a finished job can still be looked up
+POLL_SECONDS = float(os.environ.get("CODEGENIE_JOB_POLL_SECONDS", "0.5"))  # how often the page checks a running job
+# How often the page picks up a streamed job's new tokens; this adds to the time to first token
+STREAM_POLL_SECONDS = float(os.environ.get("CODEGENIE_JOB_STREAM_POLL_SECONDS", "0.25"))
+
+FINISHED = ("done", "failed", "cancelled")
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="codegenie-job")
+_lock = threading.Lock()
+_jobs = {}     # job id -> job dict
+_cancels = {}  # job id -> cancel event
+_stats = {"submitted": 0, "done": 0, "failed": 0, "cancelled": 0}
+
+metrics.register_gauge("codegenie_running_jobs", "Background generation jobs queued or running",
+                       lambda: sum(1 for job in list(_jobs.values()) if job["status"] not in FINISHED))
+
+# Function to drop finished jobs nobody looked up within JOB_TTL. Call with _lock held.
+def _prune():
+    now = time.time()
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job["finished"] is not None and now - job["finished"] > JOB_TTL]:
+        del _jobs[job_id]
+        del _cancels[job_id]
+
+# Function to start a generation in the background. model_names maps model ids to the
+# names history entries are saved under. With stream=True (and no fallback model, as hedged
+# requests are not streamed) the job's "partial" field holds the code generated so far.
+# With compare_model_ids the prompt goes to each of those models instead of model_id, and
+# the job's "results" field maps each model that has answered to its code, error and info.
+# Returns the job id.
+def submit(username, prompt, language, model_id, max_length, temperature, api_key=DEFAULT_API_KEY, use_cache=True,
+           stream=False, fallback_model_id=None, model_names=None, compare_model_ids=None):
+    job = {
+        "id": uuid.uuid4().hex, "username": username, "prompt": prompt, "language": language,
+        "model_id": model_id, "model_names": model_names or {}, "status": "queued",
+        "compare": list(compare_model_ids or []),
+        "stream": bool(stream and not fallback_model_id and not compare_model_ids),
+        "partial": None, "code": None, "error": None, "info": {}, "results": {},
+        "queue_position": None, "queue_eta": None,
+        "submitted": time.time(), "finished": None
+    }
+    cancel = threading.Event()
+    with _lock:
+        _prune()
+        _jobs[job["id"]] = job
+        _cancels[job["id"]] = cancel
+        _stats["submitted"] += 1
+    _executor.submit(_run, job, cancel, max_length, temperature, api_key, use_cache, fallback_model_id)
+    return job["id"]
+
+# Function to run a job on a worker thread
+def _run(job, cancel, max_length, temperature, api_key, use_cache, fallback_model_id):
+    job["status"] = "running"
+    info = job["info"]
+
+    def on_queue(position, eta):
+        job["queue_position"], job["queue_eta"] = position, eta
+
+    try:
+        if job["compare"]:
+            code, error = _compare(job, cancel, max_length, temperature, api_key, use_cache)
+        elif job["stream"]:
+            for partial_code in stream_code_api(job["prompt"], job["language"], job["model_id"], max_length, temperature,
+                                                api_key, use_cache=use_cache, info=info, cancel=cancel,
+                                                username=job["username"], on_queue=on_queue):
+                job["queue_position"] = None
+                job["partial"] = partial_code
+            code, error = info["code"], info["error"]
+        else:
+            code, error = generate_code_api(job["prompt"], job["language"], job["model_id"], max_length, temperature,
+                                            api_key, use_cache=use_cache, info=info,
+                                            fallback_model_id=fallback_model_id,
+                                            username=job["username"], on_queue=on_queue)
+        # Save under the model that actually answered; comparisons save each answer as it arrives
+        if not error and not cancel.is_set() and not job["compare"]:
+            answered_id = info.get("model_id", job["model_id"])
+            history_store.save_entry(job["username"], job["prompt"], job["language"],
+                                     job["model_names"].get(answered_id, answered_id), code)
+    except Exception as e:
+        code, error = None, f"Error running generation job: {str(e)}"
+
+    status = "cancelled" if cancel.is_set() else "failed" if error else "done"
+    with _lock:
+        job.update({"status": status, "code": code, "error": error, "queue_position": None,
+                    "finished": time.time()})
+        _stats[status] += 1
+
+# Function to run a model comparison for a job, saving each answer to history as it arrives.
+# Returns (None, error), with an error only when every model failed.
+def _compare(job, cancel, max_length, temperature, api_key, use_cache):
+    for model_id, code, error, info in generate_code_multi(job["prompt"], job["language"], job["compare"], max_length,
+                                                           temperature, api_key, use_cache=use_cache,
+                                                           username=job["username"]):
+        if cancel.is_set():
+            break
+        with _lock:
+            job["results"][model_id] = {"code": code, "error": error, "info": info}
+        if not error:
+            history_store.save_entry(job["username"], job["prompt"], job["language"],
+                                     job["model_names"].get(model_id, model_id), code)
+    errors = [result["error"] for result in job["results"].values() if result["error"]]
+    if errors and len(errors) == len(job["results"]):
+        return None, "Every model failed: " + "; ".join(errors)
+    return None, None
+
+# Function to get a snapshot of a job, or None if it is unknown or expired
+def get(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = dict(job)
+        snapshot["results"] = dict(job["results"])
+    snapshot["info"] = dict(snapshot["info"])
+    return snapshot
+
+# Function to cancel a job. A streamed generation stops at its next token; a blocking one
+# runs to the end but its result is dropped.
+def cancel(job_id):
+    with _lock:
+        cancel_event = _cancels.get(job_id)
+    if cancel_event is not None:
+        cancel_event.set()
+
+# Function to report job counters and how many jobs are queued or running
+def job_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["queued"] = sum(1 for job in _jobs.values() if job["status"] == "queued")
+        stats["running"] = sum(1 for job in _jobs.values() if job["status"] == "running")
+        stats["kept"] = len(_jobs)
+    stats["workers"] = JOB_WORKERS
+    return stats
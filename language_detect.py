@@ -0,0 +1,92 @@
+import re
+
+import metrics
+
+# Programming languages and their related keywords, in tie-break order.
+# Keywords are matched as whole tokens; ".py" style entries match file extensions.
+# The first keyword of every language is its name, which scores more than the others.
+LANGUAGE_KEYWORDS = {
+    "Python": ["python", ".py", "pip", "django", "flask", "numpy", "pandas"],
+    "JavaScript": ["javascript", "js", ".js", "node.js", "npm", "react", "angular", "vue"],
+    "Java": ["java", ".java", "spring", "maven", "hibernate"],
+    "C++": ["c++", ".cpp", "cmake", "stl", "vector<"],
+    "C": ["c", ".c", "pointer", "malloc", "stdio", "stdlib", "printf"],
+    "C#": ["c#", ".cs", "dotnet", "async", "await", "using"],
+    "Go": ["go", "golang", ".go", "goroutine"],
+    "Ruby": ["ruby", ".rb", "rails", "gem"],
+    "PHP": ["php", ".php", "laravel", "symphony"],
+    "Swift": ["swift", ".swift", "ios", "xcode", "cocoa"],
+    "Kotlin": ["kotlin", ".kt", "android"],
+    "Rust": ["rust", ".rs", "cargo", "crate"],
+    "TypeScript": ["typescript", "ts", ".ts", "angular", "vue"],
+    "HTML": ["html", ".html", "html5", "div", "span", "input", "form", "markup"],
+    "CSS": ["css", ".css", "stylesheet", "style", "flex", "grid", "bootstrap"],
+    "SQL": ["sql", "mysql", "postgresql", "select", "from", "where", "group by"],
+    "Shell/Bash": ["bash", "shell", ".sh", "linux", "unix", "script"],
+    "Perl": ["perl", ".pl", "regex"],
+    "R": ["r", ".r", "statistics", "ggplot", "dplyr"],
+    "MATLAB": ["matlab", ".m", "matrix", "octave"]
+}
+
+# Score weights
+NAME_WEIGHT = 3      # the language is named, e.g. "python"
+KEYWORD_WEIGHT = 1   # a related keyword, e.g. "pandas"
+PHRASE_WEIGHT = 3    # extra for "in Python" / "using Python"
+
+DEFAULT_LANGUAGE = "Python"
+
+# Splits a prompt into the tokens used as keywords, in a single scan.
+# Multi-character keywords with punctuation come first so "c++" is not read as "c".
+_TOKEN_RE = re.compile(
+    r"(?<![\w+#])(?:c\+\+|c#)(?![\w+#])|\bnode\.js\b|\bgroup\s+by\b|\bvector<|\.?\w+",
+    re.IGNORECASE
+)
+
+# Function to build the keyword index: token -> [(language, weight), ...]
+def _build_index():
+    index = {}
+    names = {}
+    for language, keywords in LANGUAGE_KEYWORDS.items():
+        for i, keyword in enumerate(keywords):
+            index.setdefault(keyword, []).append((language, NAME_WEIGHT if i == 0 else KEYWORD_WEIGHT))
+        names[keywords[0]] = language
+    return index, names
+
+_KEYWORD_INDEX, _LANGUAGE_NAMES = _build_index()
+_LANGUAGE_ORDER = {language: i for i, language in enumerate(LANGUAGE_KEYWORDS)}
+
+# Function to score every language in one pass over the prompt.
+# Each distinct keyword counts once, however often it appears.
+def score_languages(prompt):
+    tokens = [" ".join(token.lower().split()) for token in _TOKEN_RE.findall(prompt)]
+    scores = {}
+    seen = set()
+    for i, token in enumerate(tokens):
+        # "in <language>" / "using <language>" names the target language outright
+        if token in ("in", "using") and i + 1 < len(tokens) and tokens[i + 1] in _LANGUAGE_NAMES:
+            language = _LANGUAGE_NAMES[tokens[i + 1]]
+            scores[language] = scores.get(language, 0) + PHRASE_WEIGHT
+            continue
+        if token in seen or token not in _KEYWORD_INDEX:
+            continue
+        seen.add(token)
+        for language, weight in _KEYWORD_INDEX[token]:
+            scores[language] = scores.get(language, 0) + weight
+    return scores
+
+# Function to detect programming language from user's prompt.
+# The highest score wins; ties go to the language listed first. Defaults to Python.
+@metrics.timed("detect_language")
+def detect_language_from_prompt(prompt):
+    scores = score_languages(prompt)
+    if not scores:
+        return DEFAULT_LANGUAGE
+    return min(scores, key=lambda language: (-scores[language], _LANGUAGE_ORDER[language]))
+
+# Function to detect the language of many prompts at once. Repeated prompts are scored once.
+def detect_languages(prompts):
+    results = {}
+    return [
+        results[prompt] if prompt in results else results.setdefault(prompt, detect_language_from_prompt(prompt))
+        for prompt in prompts
+    ]
@@ -1,112 +1,162 @@
 import streamlit as st
-import hashlib
-import json
-import os
 from datetime import datetime, timedelta
 import time
 import random
 from streamlit_lottie import st_lottie
-import requests
 import streamlit.components.v1 as components
+import metrics
+import user_store
+from asset_cache import get_lottie
+import session_tokens
+import passwords
 
-# Function to create user database file if it doesn't exist
+# Set once the user store is ready in this process
+_database_initialized = False
+
+# Function to create the user store, import the legacy JSON database and add the default admin
 def initialize_user_database():
-    if not os.path.exists("users"):
-        os.makedirs("users")
-    
-    if not os.path.exists("users/user_database.json"):
-        users = {
-            "admin": {
-                "password": hashlib.sha256("admin123".encode()).hexdigest(),
-                "email": "admin@codegenie.com",
-                "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "last_login": None
-            }
-        }
-        with open("users/user_database.json", "w") as f:
-            json.dump(users, f, indent=4)
+    global _database_initialized
+    if _database_initialized:
+        return
+    
+    # Pick password hashing cost for this machine before the first login
+    passwords.calibrate()
+    
+    user_store.migrate_json_once()
+    
+    if user_store.count_users() == 0:
+        user_store.create_user(
+            "admin",
+            passwords.hash_password("admin123"),
+            "admin@codegenie.com",
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        )
+    _database_initialized = True
 
-# Function to load Lottie animations
+# Function to load Lottie animations from the local asset cache.
+# Returns None while the animation is not available yet; the page never waits on the CDN.
 def load_lottieurl(url):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
+    return get_lottie(url)
 
-# Function to authenticate user
+# Function to show a Lottie animation, or a static placeholder when it is not loaded
+def show_lottie(animation, height, key=None):
+    if animation is None:
+        st.markdown(f'<div style="text-align: center; font-size: {height // 2}px; line-height: {height}px;">🧞‍♂️</div>', unsafe_allow_html=True)
+    else:
+        st_lottie(animation, height=height, key=key)
+
+# Function to authenticate user. Returns a signed session token on success, None otherwise.
+@metrics.timed("login")
 def authenticate_user(username, password):
     try:
-        with open("users/user_database.json", "r") as f:
-            users = json.load(f)
+        user = user_store.get_user(username)
+        if user is None:
+            return None
         
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        matches, needs_rehash = passwords.verify_password(password, user["password"])
         
-        if username in users and users[username]["password"] == hashed_password:
+        if matches:
+            # Upgrade legacy or outdated hashes while we have the plain password
+            if needs_rehash:
+                user_store.update_password(username, passwords.hash_password(password))
             # Update last login
-            users[username]["last_login"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open("users/user_database.json", "w") as f:
-                json.dump(users, f, indent=4)
-            return True
-        return False
+            user_store.update_last_login(username, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            return session_tokens.issue_token(username)
+        return None
     except Exception as e:
         st.error(f"Authentication error: {e}")
+        return None
+
+# Name of the browser cookie that holds the session token
+SESSION_COOKIE = "codegenie_session"
+
+# Function to mark the session as logged in and remember the token in a browser cookie.
+# The token is never put in the URL, where it would be shared with every link, saved in the
+# browser history and written to proxy access logs.
+def start_session(username, token):
+    st.session_state["authenticated"] = True
+    st.session_state["username"] = username
+    st.session_state["session_token"] = token
+    st.session_state["pending_session_cookie"] = token
+
+# Function to write a pending session cookie change to the browser. Call on every rerun:
+# start_session and end_session are usually followed by st.rerun(), which would drop a
+# script rendered in the same run before the browser loads it.
+def write_session_cookie():
+    token = st.session_state.pop("pending_session_cookie", None)
+    if token is None:
+        return
+    # An empty token clears the cookie
+    max_age = session_tokens.TOKEN_TTL if token else 0
+    components.html(f"""
+    <script>
+    var secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+    window.parent.document.cookie = "{SESSION_COOKIE}={token}; Path=/; Max-Age={max_age}; SameSite=Strict" + secure;
+    </script>
+    """, height=0)
+
+# Function to restore a login from the session cookie.
+# Only the token signature and the revocation list are checked; the user database is not read.
+@metrics.timed("restore_session")
+def restore_session():
+    # Older versions kept the token in the URL; never accept it from there
+    if "session" in st.query_params:
+        del st.query_params["session"]
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return False
+    username = session_tokens.verify_token(token)
+    if username is None:
         return False
+    st.session_state["authenticated"] = True
+    st.session_state["username"] = username
+    st.session_state["session_token"] = token
+    return True
+
+# Function to log out: revoke the token on the server and forget it in the browser
+def end_session():
+    token = st.session_state.pop("session_token", None)
+    if token:
+        session_tokens.revoke_token(token)
+    st.session_state["pending_session_cookie"] = ""
+    st.session_state["authenticated"] = False
+    st.session_state.pop("username", None)
 
 # Function to register new user
 def register_user(username, password, email):
     try:
-        # Load existing users
-        with open("users/user_database.json", "r") as f:
-            users = json.load(f)
-        
         # Check if username already exists
-        if username in users:
+        if user_store.get_user(username) is not None:
             return False, "Username already exists"
         
         # Check if email is already in use
-        for user in users.values():
-            if user["email"] == email:
-                return False, "Email already in use"
-        
-        # Add new user
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        users[username] = {
-            "password": hashed_password,
-            "email": email,
-            "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "last_login": None
-        }
+        if user_store.get_user_by_email(email) is not None:
+            return False, "Email already in use"
         
-        # Save updated users
-        with open("users/user_database.json", "w") as f:
-            json.dump(users, f, indent=4)
-        
-        return True, "Registration successful"
+        # Add new user; the store's unique indexes catch a concurrent registration
+        hashed_password = passwords.hash_password(password)
+        return user_store.create_user(
+            username,
+            hashed_password,
+            email,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        )
     except Exception as e:
         return False, f"Registration error: {e}"
 
 # Function for reset password
 def reset_password(email, new_password):
     try:
-        # Load existing users
-        with open("users/user_database.json", "r") as f:
-            users = json.load(f)
-        
         # Find user with matching email
-        username_found = None
-        for username, user_data in users.items():
-            if user_data["email"] == email:
-                username_found = username
-                break
+        user = user_store.get_user_by_email(email)
         
-        if username_found:
+        if user is not None:
             # Update password
-            hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
-            users[username_found]["password"] = hashed_password
+            hashed_password = passwords.hash_password(new_password)
+            user_store.update_password(user["username"], hashed_password)
             
-            # Save updated users
-            with open("users/user_database.json", "w") as f:
-                json.dump(users, f, indent=4)
+            # Log out every session that still holds a token for the old password
+            session_tokens.revoke_user(user["username"])
             
             return True, "Password reset successful"
         else:
@@ -422,7 +472,7 @@ def login_page():
     
     # Animated logo and title section
     st.markdown('<div class="floating">', unsafe_allow_html=True)
-    st_lottie(lottie_coding, height=180, key="coding")
+    show_lottie(lottie_coding, height=180, key="coding")
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Title without glow effect
@@ -445,14 +495,14 @@ def login_page():
             with st.spinner("Authenticating..."):
                 time.sleep(1)  # Simulate loading
                 if username and password:
-                    if authenticate_user(username, password):
+                    session_token = authenticate_user(username, password)
+                    if session_token:
                         st.balloons()
                         st.markdown('<div class="success-msg">', unsafe_allow_html=True)
                         st.success("Login successful! Redirecting...")
                         st.markdown('</div>', unsafe_allow_html=True)
                         # Store in session state
-                        st.session_state["authenticated"] = True
-                        st.session_state["username"] = username
+                        start_session(username, session_token)
                         # Add a progress bar before redirect
                         progress_bar = st.progress(0)
                         for percent_complete in range(100):
@@ -536,8 +586,9 @@ def main():
     if "authenticated" not in st.session_state:
         st.session_state["authenticated"] = False
     
-    # If not authenticated, show login page
-    if not st.session_state["authenticated"]:
+    # If not authenticated, restore the login from a session token or show login page
+    write_session_cookie()
+    if not st.session_state["authenticated"] and not restore_session():
         login_page()
     else:
         # Here we would import and run the main CodeGenie application
@@ -568,14 +619,13 @@ def main():
         st.markdown(f'<h3>Welcome, <span style="color: #e94560;">{st.session_state["username"]}</span>!</h3>', unsafe_allow_html=True)
         
         # Welcome animation centered
-        st_lottie(lottie_welcome, height=250)
+        show_lottie(lottie_welcome, height=250)
         
         # Logout button centered
         if st.button("Logout", key="logout_button"):
             with st.spinner("Logging out..."):
                 time.sleep(1)
-                st.session_state["authenticated"] = False
-                st.session_state.pop("username", None)
+                end_session()
                 st.rerun()
         
         # Placeholder for demonstration
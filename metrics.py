@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from storage import atomic_write
+
+# Process-wide metrics in the Prometheus text format: a latency histogram per stage of a
+# generation, counters per model and gauges read when scraped. Export them with either
+#   CODEGENIE_METRICS_PORT=9464             serves http://<host>:9464/metrics
+#   CODEGENIE_METRICS_FILE=/path/codegenie.prom  rewritten every CODEGENIE_METRICS_INTERVAL seconds
+#                                           (for node_exporter's textfile collector)
+METRICS_PORT = int(os.environ.get("CODEGENIE_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("CODEGENIE_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("CODEGENIE_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.environ.get("CODEGENIE_METRICS_INTERVAL", "15"))
+# Sessions count as active for this long after their last rerun
+SESSION_WINDOW = float(os.environ.get("CODEGENIE_METRICS_SESSION_WINDOW", "300"))
+
+# Histogram buckets in seconds, from sub-millisecond local work to slow model calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_COUNTERS = {
+    "codegenie_generation_requests_total": "Generation requests, by model",
+    "codegenie_generation_errors_total": "Generation requests that failed, by model",
+    "codegenie_cache_hits_total": "Generation requests answered from the response cache, by model",
+    "codegenie_retries_total": "Retried inference API calls, by model",
+    "codegenie_hedge_cancellations_total": "Hedged requests to a model cancelled because the other model answered first",
+}
+
+_lock = threading.Lock()
+_stages = {}    # stage -> [bucket counts, sum, count]
+_counters = {}  # (name, model) -> value
+_gauges = {}    # name -> (help, function returning the value)
+_sessions = {}  # session id -> time of its last rerun
+_exporter_started = False
+
+# Function to record how long one run of a stage took
+def observe(stage, seconds):
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += seconds
+        histogram[2] += 1
+
+# Function to time a stage, as a with-block or as a function decorator
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+# Function to add to a per-model counter (see _COUNTERS)
+def inc(name, model, amount=1):
+    with _lock:
+        _counters[(name, model)] = _counters.get((name, model), 0) + amount
+
+# Function to register a gauge whose value is read from fn() at every scrape
+def register_gauge(name, help_text, fn):
+    _gauges[name] = (help_text, fn)
+
+# Function to note that a session has just rerun, for the active sessions gauge
+def touch_session(session_id):
+    now = time.monotonic()
+    with _lock:
+        _sessions[session_id] = now
+        if len(_sessions) > 1000:
+            for stale in [sid for sid, seen in _sessions.items() if now - seen > SESSION_WINDOW]:
+                del _sessions[stale]
+
+def _active_sessions():
+    now = time.monotonic()
+    with _lock:
+        return sum(1 for seen in _sessions.values() if now - seen <= SESSION_WINDOW)
+
+register_gauge("codegenie_active_sessions", f"Sessions that reran in the last {SESSION_WINDOW:.0f}s", _active_sessions)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Function to render every metric in the Prometheus text exposition format
+def render():
+    with _lock:
+        stages = {stage: (list(buckets), total, count) for stage, (buckets, total, count) in _stages.items()}
+        counters = dict(_counters)
+    lines = [
+        "# HELP codegenie_stage_seconds Time spent in each stage of a generation",
+        "# TYPE codegenie_stage_seconds histogram",
+    ]
+    for stage, (buckets, total, count) in sorted(stages.items()):
+        label = f'stage="{_escape(stage)}"'
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f'codegenie_stage_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'codegenie_stage_seconds_bucket{{{label},le="+Inf"}} {count}')
+        lines.append(f"codegenie_stage_seconds_sum{{{label}}} {total}")
+        lines.append(f"codegenie_stage_seconds_count{{{label}}} {count}")
+
+    for name, help_text in _COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (counter, model), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f'{name}{{model="{_escape(model)}"}} {value}')
+
+    for name, (help_text, fn) in sorted(_gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {fn()}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        data = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def _write_file_forever():
+    while True:
+        try:
+            atomic_write(METRICS_FILE, render())
+        except OSError:
+            pass
+        time.sleep(METRICS_INTERVAL)
+
+# Function to start the configured exporters, once per process. Streamlit runs the
+# script again on every rerun, so later calls do nothing.
+def start_exporter():
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            # Another process already serves the port; the app works without the endpoint
+            print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="codegenie-metrics").start()
+    if METRICS_FILE:
+        threading.Thread(target=_write_file_forever, daemon=True, name="codegenie-metrics-file").start()
+
+# Function to summarise the stage timings and where metrics are exported
+def metrics_stats():
+    with _lock:
+        stages = {stage: {"count": count, "avg_ms": total / count * 1000 if count else 0.0}
+                  for stage, (_, total, count) in _stages.items()}
+    return {"port": METRICS_PORT or None, "file": METRICS_FILE or None, "stages": stages}
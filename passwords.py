@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Versioned password hashes. Stored formats:
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#   64 hex characters: legacy unsalted sha256, rehashed on the next successful login
+SCHEME = os.environ.get("CODEGENIE_HASH_SCHEME", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256")
+TARGET_MS = float(os.environ.get("CODEGENIE_HASH_TARGET_MS", "100"))  # calibrated cost of one hash
+HASH_WORKERS = int(os.environ.get("CODEGENIE_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Cost bounds; the minimums keep calibration on a fast machine from picking weak parameters.
+# Only lower them through the environment for tests and benchmarks.
+SCRYPT_MIN_N = int(os.environ.get("CODEGENIE_SCRYPT_MIN_N", str(2 ** 14)))
+SCRYPT_MAX_N = 2 ** 17
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_MIN_ITERATIONS = int(os.environ.get("CODEGENIE_PBKDF2_MIN_ITERATIONS", "100000"))
+PBKDF2_MAX_ITERATIONS = 5_000_000
+
+# Hashing runs on this pool so a login burst queues here instead of
+# oversubscribing the CPU from every Streamlit script thread at once
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="codegenie-hash")
+
+_params = None
+_params_lock = threading.Lock()
+
+def _b64encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+def _b64decode(text):
+    return base64.b64decode(text.encode("ascii"))
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+# Function to pick cost parameters that take about TARGET_MS on this machine
+def calibrate():
+    global _params
+    with _params_lock:
+        if _params is not None:
+            return _params
+
+        salt = secrets.token_bytes(16)
+        if SCHEME == "scrypt":
+            n = SCRYPT_MIN_N
+            while n < SCRYPT_MAX_N:
+                start = time.perf_counter()
+                _scrypt("calibration", salt, n, SCRYPT_R, SCRYPT_P)
+                if (time.perf_counter() - start) * 1000 >= TARGET_MS / 2:
+                    break
+                n *= 2
+            _params = {"scheme": "scrypt", "n": n, "r": SCRYPT_R, "p": SCRYPT_P}
+        else:
+            probe = 50_000
+            start = time.perf_counter()
+            _pbkdf2("calibration", salt, probe)
+            per_iteration = (time.perf_counter() - start) / probe
+            iterations = int(TARGET_MS / 1000 / per_iteration) if per_iteration else PBKDF2_MIN_ITERATIONS
+            iterations = max(PBKDF2_MIN_ITERATIONS, min(PBKDF2_MAX_ITERATIONS, iterations))
+            _params = {"scheme": "pbkdf2_sha256", "iterations": iterations}
+    return _params
+
+def _hash(password):
+    params = calibrate()
+    salt = secrets.token_bytes(16)
+    if params["scheme"] == "scrypt":
+        digest = _scrypt(password, salt, params["n"], params["r"], params["p"])
+        return f"scrypt${params['n']}${params['r']}${params['p']}${_b64encode(salt)}${_b64encode(digest)}"
+    digest = _pbkdf2(password, salt, params["iterations"])
+    return f"pbkdf2_sha256${params['iterations']}${_b64encode(salt)}${_b64encode(digest)}"
+
+def _verify(password, stored):
+    params = calibrate()
+    parts = stored.split("$")
+
+    if parts[0] == "scrypt" and len(parts) == 6:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        digest = _scrypt(password, _b64decode(parts[4]), n, r, p)
+        ok = hmac.compare_digest(digest, _b64decode(parts[5]))
+        current = params["scheme"] == "scrypt" and n >= params["n"] and r == params["r"] and p == params["p"]
+        return ok, ok and not current
+
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        iterations = int(parts[1])
+        digest = _pbkdf2(password, _b64decode(parts[2]), iterations)
+        ok = hmac.compare_digest(digest, _b64decode(parts[3]))
+        current = params["scheme"] == "pbkdf2_sha256" and iterations >= params["iterations"]
+        return ok, ok and not current
+
+    # Legacy unsalted sha256
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    ok = hmac.compare_digest(legacy, stored)
+    return ok, ok
+
+# Function to hash a password on the hashing pool
+def hash_password(password):
+    return _executor.submit(_hash, password).result()
+
+# Function to check a password on the hashing pool.
+# Returns (matches, needs_rehash); needs_rehash is set for legacy or outdated hashes that matched.
+def verify_password(password, stored):
+    return _executor.submit(_verify, password, stored).result()
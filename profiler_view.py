@@ -0,0 +1,87 @@
+import streamlit as st
+
+import rerun_profiler
+
+# Admin view of the reruns recorded by the opt-in profiler (CODEGENIE_PROFILE=1).
+# It is a tab of app1.py rather than a file in pages/: a pages directory switches Streamlit
+# into multipage mode, which costs every rerun of every user more than the profiler measures.
+
+# Function to get a percentile (0-100) of sorted samples
+def percentile(samples, p):
+    return samples[int(p / 100 * (len(samples) - 1))]
+
+# Function to show logged reruns: timings overall and per session, and the hottest functions
+def show_profiler_page():
+    st.markdown("""
+    <div style="animation: slideInRight 0.6s ease-out;">
+        <h2>⏱️ Rerun Profiler</h2>
+        <p>Where reruns of the page spend their time.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    if not rerun_profiler.ENABLED:
+        st.info("Profiling is off. Start the app with CODEGENIE_PROFILE=1 to record reruns.")
+
+    # Reading the log takes a while, so only do it on request
+    if not st.toggle("Load profiles", key="profiler_load"):
+        return
+    limit = st.slider("Reruns to load (newest first)", min_value=10, max_value=2000, value=200, step=10,
+                      key="profiler_limit")
+    records = rerun_profiler.read_log(limit=limit)
+    if not records:
+        st.caption(f"No reruns logged in {rerun_profiler.LOG_PATH} yet.")
+        return
+
+    # Rerun times across all sessions
+    rerun_times = sorted(record["rerun_ms"] for record in records)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Reruns", len(records))
+    col2.metric("p50", f"{percentile(rerun_times, 50):.1f} ms")
+    col3.metric("p95", f"{percentile(rerun_times, 95):.1f} ms")
+    col4.metric("Slowest", f"{rerun_times[-1]:.1f} ms")
+
+    # Rerun time per session
+    st.subheader("Sessions")
+    sessions = {}
+    for record in records:
+        session = sessions.setdefault(record["session"], {
+            "session": (record["session"] or "-")[:8], "username": record["username"], "reruns": 0,
+            "total_ms": 0.0, "slowest_ms": 0.0, "interrupted": 0, "last_seen": record["time"]
+        })
+        session["reruns"] += 1
+        session["total_ms"] += record["rerun_ms"]
+        session["slowest_ms"] = max(session["slowest_ms"], record["rerun_ms"])
+        session["interrupted"] += record["interrupted"]
+    for session in sessions.values():
+        session["avg_ms"] = round(session.pop("total_ms") / session["reruns"], 1)
+    st.dataframe(sorted(sessions.values(), key=lambda session: -session["avg_ms"]))
+
+    # Functions with the most time of their own over the loaded reruns. Each rerun only logs
+    # its top functions, so these are lower bounds.
+    st.subheader("Hottest functions")
+    functions = {}
+    for record in records:
+        for entry in record["top"]:
+            function = functions.setdefault(entry["function"], {
+                "function": entry["function"], "reruns": 0, "calls": 0, "self_ms": 0.0, "total_ms": 0.0
+            })
+            function["reruns"] += 1
+            function["calls"] += entry["calls"]
+            function["self_ms"] += entry["self_ms"]
+            function["total_ms"] += entry["total_ms"]
+    hottest = sorted(functions.values(), key=lambda function: -function["self_ms"])[:rerun_profiler.TOP_N]
+    for function in hottest:
+        function["self_ms_per_rerun"] = round(function["self_ms"] / len(records), 3)
+        function["self_ms"] = round(function["self_ms"], 1)
+        function["total_ms"] = round(function["total_ms"], 1)
+    st.dataframe(hottest)
+
+    # One rerun in detail
+    st.subheader("Single rerun")
+    labels = [
+        f"{record['time']} · {record['username'] or 'logged out'} · {record['rerun_ms']:.1f} ms"
+        + (" · interrupted" if record["interrupted"] else "")
+        for record in records
+    ]
+    selected = st.selectbox("Rerun", range(len(records)), format_func=lambda index: labels[index],
+                            key="profiler_rerun")
+    st.dataframe(records[selected]["top"])
@@ -0,0 +1,88 @@
+import re
+from functools import lru_cache
+
+# Prompt templates, keyed by (model family, language, web project or not).
+# Every character is sent to the model as input tokens, so templates carry no indentation
+# and use each family's own instruction format.
+
+# What we ask for, with {language} and {prompt} slots
+_INSTRUCTIONS = {
+    False: (
+        "Write {language} code for this task:\n{prompt}\n\n"
+        "Include necessary imports and short comments, and follow {language} best practices. "
+        "Put the code in one fenced code block."
+    ),
+    True: (
+        "Write a web page for this task:\n{prompt}\n\n"
+        "Use HTML for structure, CSS for styling and JavaScript if needed, with short comments. "
+        "Put the code in fenced code blocks."
+    )
+}
+
+# How each model family expects an instruction to be wrapped
+_FORMATS = {
+    "mistral": "[INST] {instruction} [/INST]",
+    "codellama": "[INST] {instruction} [/INST]",
+    "bloomz": "{instruction}\nCode:\n",
+    "generic": "{instruction}\n\nCode:\n"
+}
+
+# Text between the wrapped instruction and the opening fence that starts the answer
+_PRIMER_SEPARATORS = {
+    "mistral": " ",
+    "codellama": " ",
+    "bloomz": "",
+    "generic": ""
+}
+
+# Fence tags for languages whose name is not a plain word
+_FENCE_TAGS = {"C++": "cpp", "C#": "csharp", "Shell/Bash": "bash"}
+
+# Substrings of a model_id that identify its family, checked in order
+_FAMILY_MARKERS = [("codellama", "codellama"), ("mistral", "mistral"), ("bloom", "bloomz")]
+
+# Function to get the template family of a model
+def model_family(model_id):
+    model_id = model_id.lower()
+    for marker, family in _FAMILY_MARKERS:
+        if marker in model_id:
+            return family
+    return "generic"
+
+# Function to tell whether a prompt asks for a combined HTML/CSS/JS project
+def is_web_project(prompt):
+    prompt = prompt.upper()
+    return "HTML" in prompt and "CSS" in prompt
+
+# Function to get the opening fence the answer is primed with. Single-file answers start
+# inside a code block, so the model's first ``` closes it and can serve as a stop sequence.
+# Web projects span several blocks and are not primed.
+def response_primer(prompt, language):
+    if is_web_project(prompt):
+        return ""
+    return "```" + _FENCE_TAGS.get(language, re.sub(r"\W", "", language.lower())) + "\n"
+
+# Function to get the stop sequences that end the answer once its code block is closed
+def stop_sequences(prompt):
+    return [] if is_web_project(prompt) else ["```"]
+
+# Function to compile the template for one (family, language, web) key, once.
+# Returns the text before and after the user's prompt.
+@lru_cache(maxsize=None)
+def compile_template(family, language, web):
+    # Fill in the instruction as plain text so braces in it are not re-parsed
+    text = _FORMATS[family].replace("{instruction}", _INSTRUCTIONS[web])
+    text = text.replace("{language}", language)
+    if not web:
+        text += _PRIMER_SEPARATORS[family] + response_primer("", language)
+    prefix, suffix = text.split("{prompt}")
+    return prefix, suffix
+
+# Function to build the full prompt for a model
+def render(prompt, language, model_id):
+    prefix, suffix = compile_template(model_family(model_id), language, is_web_project(prompt))
+    return prefix + prompt + suffix
+
+# Function to list every template family, for reports
+def families():
+    return list(_FORMATS)
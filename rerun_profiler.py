@@ -0,0 +1,134 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Opt-in profiler for Streamlit reruns. With CODEGENIE_PROFILE=1 every full run of app1.py
+# runs under cProfile. The run time and the functions with the most time of their own are
+# written as one JSON line per rerun to a rotating log, which admins can browse in the
+# Profiler tab (profiler_view.py).
+# Profiling slows the app down noticeably; leave it off in normal use.
+ENABLED = os.environ.get("CODEGENIE_PROFILE", "0") == "1"
+TOP_N = int(os.environ.get("CODEGENIE_PROFILE_TOP", "25"))
+LOG_PATH = os.environ.get("CODEGENIE_PROFILE_LOG", os.path.join("logs", "rerun_profile.log"))
+LOG_MAX_BYTES = int(os.environ.get("CODEGENIE_PROFILE_LOG_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("CODEGENIE_PROFILE_LOG_BACKUPS", "3"))
+
+# Reruns being profiled, by session: session id -> (profile, start time, session id, script thread).
+# A rerun that raises (st.rerun, st.stop, an error) never reaches finish_rerun(), and
+# Streamlit runs the next rerun on a new thread, so leftovers are found by session.
+_runs = {}
+_runs_lock = threading.Lock()
+
+_handler = None
+_handler_lock = threading.Lock()
+
+# Function to get the rotating log, creating it on first use. Records go straight to the
+# handler, so logging configuration elsewhere (levels, logging.disable) cannot drop them.
+def _get_handler():
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+            _handler = RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            _handler.setFormatter(logging.Formatter("%(message)s"))
+    return _handler
+
+# Function to get the current Streamlit session id, or None outside a script run
+def _session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+# Function to take the rerun of a session out of the running set, or None
+def _take(session_id):
+    with _runs_lock:
+        return _runs.pop(session_id, None)
+
+# Function to take the reruns whose script thread has ended without finishing them
+def _take_abandoned():
+    with _runs_lock:
+        abandoned = [session_id for session_id, run in _runs.items() if not run[3].is_alive()]
+        return [_runs.pop(session_id) for session_id in abandoned]
+
+# Function to start profiling a rerun. Call at the top of the script.
+def start_rerun():
+    if not ENABLED:
+        return
+    session_id = _session_id()
+    # Log reruns that raised before they finished as interrupted: this session's previous
+    # one, and those of any session whose script thread has ended (e.g. a closed tab).
+    # Their profiles must be stopped, as Python 3.12+ allows one active profiler per process.
+    _finish(_take(session_id), interrupted=True)
+    for run in _take_abandoned():
+        _finish(run, interrupted=True)
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another session's rerun is being profiled right now (Python 3.12+); skip this one
+        return
+    with _runs_lock:
+        _runs[session_id] = (profile, time.perf_counter(), session_id, threading.current_thread())
+
+# Function to make a file path in a profile short enough to read
+def _short_path(path):
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    return os.path.relpath(path) if os.path.isabs(path) else path
+
+# Function to stop profiling the rerun and write it to the log. Call at the end of the script.
+def finish_rerun(username=None, interrupted=False):
+    _finish(_take(_session_id()), username, interrupted)
+
+# Function to stop a profile and write its rerun to the log
+def _finish(run, username=None, interrupted=False):
+    if run is None:
+        return
+    profile, start, session_id, _ = run
+    profile.disable()
+    rerun_ms = (time.perf_counter() - start) * 1000
+
+    stats = pstats.Stats(profile).stats
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+    record = {
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "session": session_id,
+        "username": username,
+        "rerun_ms": round(rerun_ms, 3),
+        "interrupted": interrupted,
+        "top": [
+            {
+                "function": f"{_short_path(filename)}:{line}({name})",
+                "calls": calls,
+                "self_ms": round(self_time * 1000, 3),
+                "total_ms": round(total_time * 1000, 3)
+            }
+            for (filename, line, name), (_, calls, self_time, total_time, _) in hottest
+        ]
+    }
+    _get_handler().handle(logging.makeLogRecord({"msg": json.dumps(record)}))
+
+# Function to read logged reruns, newest first
+def read_log(limit=500):
+    records = []
+    for index in range(LOG_BACKUPS + 1):
+        path = LOG_PATH if index == 0 else f"{LOG_PATH}.{index}"
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(records) >= limit:
+                return records
+    return records
@@ -0,0 +1,136 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+import http_pool
+import metrics
+
+# Retry settings, overridable through the environment
+MAX_RETRIES = int(os.environ.get("CODEGENIE_RETRY_MAX", "4"))
+BACKOFF_BASE = float(os.environ.get("CODEGENIE_RETRY_BACKOFF_BASE", "0.5"))  # seconds, doubled per attempt
+BACKOFF_MAX = float(os.environ.get("CODEGENIE_RETRY_BACKOFF_MAX", "20"))
+DEADLINE = float(os.environ.get("CODEGENIE_GENERATION_DEADLINE", "90"))  # total seconds per generation
+
+# Status codes worth another attempt: rate limited, model loading, gateway trouble
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_stats_lock = threading.Lock()
+_stats = {"attempts": 0, "retries": 0, "gave_up": 0, "deadline_exceeded": 0, "wait_seconds": 0.0}
+
+# Function to read the server's wait hint in seconds: Retry-After, or HF's estimated_time
+# for a model that is still loading. Returns None when there is no hint.
+def server_wait_hint(response):
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    if response.status_code == 503:
+        try:
+            estimated = response.json().get("estimated_time")
+        except (ValueError, AttributeError):
+            estimated = None
+        if estimated is not None:
+            return max(0.0, float(estimated))
+    return None
+
+# Function to pick the wait before the next attempt: the server's hint when it gave one,
+# otherwise exponential backoff with full jitter
+def backoff_delay(retry, hint=None):
+    if hint is not None:
+        return hint + random.uniform(0, min(1.0, hint * 0.1))
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** retry)))
+
+# Function to get the monotonic deadline of a generation that starts now
+def new_deadline(seconds=None):
+    return time.monotonic() + (DEADLINE if seconds is None else seconds)
+
+# Function to POST with timeouts, retries and a total deadline.
+# Returns (response, error). The response is returned as-is for non-retryable statuses, and
+# for the last retryable one when attempts run out. The number of retries and the time
+# spent waiting are added to the info dict. Setting the optional cancel event stops
+# further attempts.
+@metrics.timed("http")
+def post_with_retries(url, info=None, deadline=None, cancel=None, **kwargs):
+    if info is None:
+        info = {}
+    info.setdefault("retries", 0)
+    info.setdefault("retry_wait", 0.0)
+    if deadline is None:
+        deadline = new_deadline()
+    connect_timeout, read_timeout = http_pool.request_timeout()
+
+    retry = 0
+    while True:
+        if cancel is not None and cancel.is_set():
+            return None, "Request cancelled"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, _give_up(f"Gave up after {retry} retries: generation deadline of {DEADLINE:.0f}s exceeded", deadline=True)
+
+        with _stats_lock:
+            _stats["attempts"] += 1
+        try:
+            # Never let a single attempt outlive the overall deadline
+            response = http_pool.post(url, timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            response, failure, hint = None, f"Error making API request: {str(e)}", None
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                return response, None
+            failure, hint = None, server_wait_hint(response)
+
+        if retry >= MAX_RETRIES:
+            if response is not None:
+                return response, None
+            return None, _give_up(f"{failure} (after {retry} retries)")
+
+        delay = backoff_delay(retry, hint)
+        if time.monotonic() + delay >= deadline:
+            # Waiting would blow the deadline anyway, so fail now with the reason
+            if response is not None:
+                response.close()
+                reason = f"status code {response.status_code}"
+                if hint is not None:
+                    reason += f", server asked to wait {hint:.0f}s"
+            else:
+                reason = failure
+            return None, _give_up(f"Gave up after {retry} retries ({reason}): generation deadline of {DEADLINE:.0f}s would be exceeded", deadline=True)
+
+        if response is not None:
+            response.close()
+        if cancel is not None:
+            if cancel.wait(delay):
+                return None, "Request cancelled"
+        else:
+            time.sleep(delay)
+        retry += 1
+        info["retries"] = retry
+        info["retry_wait"] += delay
+        with _stats_lock:
+            _stats["retries"] += 1
+            _stats["wait_seconds"] += delay
+
+def _give_up(error, deadline=False):
+    with _stats_lock:
+        _stats["gave_up"] += 1
+        if deadline:
+            _stats["deadline_exceeded"] += 1
+    return error
+
+# Function to report retry counters and the active policy
+def retry_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["max_retries"] = MAX_RETRIES
+    stats["deadline_seconds"] = DEADLINE
+    return stats
@@ -0,0 +1,176 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# Fair-share scheduler for upstream inference calls. Every session calls the API from its own
+# script thread, so without this one busy user can use up the shared quota and push everyone
+# into 429s. Three limits apply:
+#  - a token bucket per user, so nobody can send more than USER_RATE generations a minute
+#    (after a burst of USER_BURST);
+#  - a global cap on calls in flight;
+#  - a queue for calls over the cap that takes turns between users, so a user with many
+#    requests waiting does not hold up a user with one.
+MAX_CONCURRENT = int(os.environ.get("CODEGENIE_MAX_CONCURRENT", "8"))
+USER_RATE = float(os.environ.get("CODEGENIE_USER_RATE", "10"))  # generations per minute, 0 for no limit
+USER_BURST = int(os.environ.get("CODEGENIE_USER_BURST", "5"))
+QUEUE_TIMEOUT = float(os.environ.get("CODEGENIE_QUEUE_TIMEOUT", "120"))  # seconds
+# Assumed duration of a call until there are samples, for wait estimates
+DEFAULT_CALL_SECONDS = float(os.environ.get("CODEGENIE_QUEUE_DEFAULT_ESTIMATE", "10"))
+
+_lock = threading.Lock()
+_buckets = {}     # username -> (tokens, time of the last refill)
+_queues = {}      # username -> deque of waiting tickets
+_turns = deque()  # usernames with waiting tickets, in the order they get their next slot
+_active = 0
+_durations = deque(maxlen=50)  # seconds recent calls held their slot
+_stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "timeouts": 0, "cancelled": 0,
+          "queue_wait_total": 0.0, "max_queue_length": 0}
+
+class _Ticket:
+    def __init__(self, username):
+        self.username = username
+        self.granted = threading.Event()
+        self.enqueued = time.monotonic()
+        self.started = None
+
+metrics.register_gauge("codegenie_inflight_requests", "Inference API calls in flight", lambda: _active)
+metrics.register_gauge("codegenie_queued_requests", "Inference API calls waiting for a slot",
+                       lambda: sum(len(queue) for queue in list(_queues.values())))
+
+# Function to take one generation from the user's token bucket.
+# Returns 0 if allowed, otherwise the seconds until the user may generate again.
+# Requests without a username (benchmarks, scripts) are not rate limited.
+def take_token(username):
+    if username is None or USER_RATE <= 0:
+        return 0.0
+    now = time.monotonic()
+    with _lock:
+        tokens, last = _buckets.get(username, (USER_BURST, now))
+        tokens = min(USER_BURST, tokens + (now - last) * USER_RATE / 60)
+        if tokens >= 1:
+            _buckets[username] = (tokens - 1, now)
+            return 0.0
+        _buckets[username] = (tokens, now)
+        _stats["rate_limited"] += 1
+    return (1 - tokens) * 60 / USER_RATE
+
+# Function to hand free slots to waiting tickets, one user at a time. Call with _lock held.
+def _grant_waiting():
+    global _active
+    while _active < MAX_CONCURRENT and _turns:
+        username = _turns.popleft()
+        queue = _queues[username]
+        ticket = queue.popleft()
+        if queue:
+            _turns.append(username)
+        else:
+            del _queues[username]
+        _active += 1
+        ticket.started = time.monotonic()
+        ticket.granted.set()
+
+# Function to get a waiting ticket's place in the queue (1 = next). Users take turns, so
+# the k-th ticket of a user goes after up to k tickets of every other user. Call with _lock held.
+def _position(ticket):
+    queue = _queues.get(ticket.username)
+    if queue is None or ticket not in queue:
+        return 0
+    index = queue.index(ticket)
+    turn = _turns.index(ticket.username)
+    ahead = index
+    for other_turn, other in enumerate(_turns):
+        if other != ticket.username:
+            ahead += min(len(_queues[other]), index + (1 if other_turn < turn else 0))
+    return ahead + 1
+
+# Function to estimate the seconds until a queue position gets a slot. Call with _lock held.
+def _estimated_wait(position):
+    average = sum(_durations) / len(_durations) if _durations else DEFAULT_CALL_SECONDS
+    return math.ceil(position / MAX_CONCURRENT) * average
+
+# Function to take a slot for an upstream call, waiting in the fair queue if all are in use.
+# on_wait(position, estimated seconds) is called from the waiting thread about twice a
+# second while queued. Setting the optional cancel event leaves the queue.
+# Returns (ticket, error); pass the ticket to release() when the call is done.
+def acquire(username, on_wait=None, cancel=None):
+    ticket = _Ticket(username or "")
+    with _lock:
+        if ticket.username not in _queues:
+            _queues[ticket.username] = deque()
+            _turns.append(ticket.username)
+        _queues[ticket.username].append(ticket)
+        _grant_waiting()
+        if not ticket.granted.is_set():
+            _stats["queued"] += 1
+            _stats["max_queue_length"] = max(_stats["max_queue_length"], sum(len(q) for q in _queues.values()))
+
+    error = None
+    try:
+        while not ticket.granted.wait(0.5):
+            if cancel is not None and cancel.is_set():
+                error = "Request cancelled"
+            elif time.monotonic() - ticket.enqueued > QUEUE_TIMEOUT:
+                error = f"Waited more than {QUEUE_TIMEOUT:.0f}s in the generation queue, the service is busy"
+            if error:
+                break
+            if on_wait is not None:
+                with _lock:
+                    position = _position(ticket)
+                    estimate = _estimated_wait(position)
+                if position:
+                    on_wait(position, estimate)
+    except BaseException:
+        # The caller went away (e.g. a Streamlit rerun raised from on_wait)
+        if not _leave(ticket):
+            release(ticket)
+        raise
+
+    if error and _leave(ticket):
+        with _lock:
+            _stats["cancelled" if error == "Request cancelled" else "timeouts"] += 1
+        return None, error
+    with _lock:
+        _stats["admitted"] += 1
+        _stats["queue_wait_total"] += ticket.started - ticket.enqueued
+    return ticket, None
+
+# Function to take a ticket out of the queue. Returns False if it already has a slot.
+def _leave(ticket):
+    with _lock:
+        # Slots are granted under the lock, so this cannot change while we hold it
+        if ticket.granted.is_set():
+            return False
+        queue = _queues[ticket.username]
+        queue.remove(ticket)
+        if not queue:
+            del _queues[ticket.username]
+            _turns.remove(ticket.username)
+    return True
+
+# Function to give back a slot taken with acquire()
+def release(ticket):
+    global _active
+    with _lock:
+        _active -= 1
+        _durations.append(time.monotonic() - ticket.started)
+        _grant_waiting()
+
+# Function to get the seconds a ticket waited in the queue
+def queue_wait(ticket):
+    return ticket.started - ticket.enqueued
+
+# Function to report the scheduler's limits, load and counters
+def scheduler_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["active"] = _active
+        stats["waiting"] = {username: len(queue) for username, queue in _queues.items()}
+        average = sum(_durations) / len(_durations) if _durations else None
+    stats.update({"max_concurrent": MAX_CONCURRENT, "user_rate_per_minute": USER_RATE, "user_burst": USER_BURST,
+                  "avg_call_seconds": average})
+    stats["avg_queue_wait"] = stats["queue_wait_total"] / stats["admitted"] if stats["admitted"] else 0.0
+    return stats
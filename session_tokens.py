@@ -0,0 +1,119 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+from storage import atomic_create, thread_connection, write_transaction
+
+# Signed session tokens let a returning browser restore its login without the login page.
+# Tokens are "<payload>.<signature>", both base64url; the payload holds user, issue time,
+# expiry and a random id used for revocation.
+SESSIONS_DIR = "users"
+SECRET_FILE = os.path.join(SESSIONS_DIR, "session_secret.key")
+SESSIONS_DB = os.path.join(SESSIONS_DIR, "sessions.db")
+TOKEN_TTL = int(os.environ.get("CODEGENIE_SESSION_TTL", str(7 * 24 * 3600)))  # seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS revoked_users (
+    username TEXT PRIMARY KEY,
+    revoked_before REAL NOT NULL
+);
+"""
+
+_secret = None
+_secret_lock = threading.Lock()
+
+# Function to get the signing secret: CODEGENIE_SESSION_SECRET, or a key file created on first use
+def get_secret():
+    global _secret
+    if _secret is not None:
+        return _secret
+
+    with _secret_lock:
+        if _secret is None:
+            env_secret = os.environ.get("CODEGENIE_SESSION_SECRET")
+            if env_secret:
+                _secret = env_secret.encode("utf-8")
+            else:
+                # When several processes start at once, only the first key file is kept
+                if not os.path.exists(SECRET_FILE):
+                    atomic_create(SECRET_FILE, secrets.token_hex(32))
+                with open(SECRET_FILE, "r") as f:
+                    _secret = f.read().strip().encode("utf-8")
+    return _secret
+
+# Function to get this thread's connection to the revocation list
+def get_connection():
+    return thread_connection(SESSIONS_DB, _SCHEMA)
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload):
+    return _b64encode(hmac.new(get_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+
+# Function to issue a session token for a user
+def issue_token(username, ttl=TOKEN_TTL):
+    now = time.time()
+    claims = {"u": username, "iat": now, "exp": int(now) + ttl, "jti": secrets.token_urlsafe(12)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+# Function to read the claims of a correctly signed, unexpired token. Returns None otherwise.
+def decode_token(token):
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    try:
+        if not hmac.compare_digest(signature.encode("ascii"), _sign(payload).encode("ascii")):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+# Function to check a token. Returns the username, or None if it is invalid, expired or revoked.
+def verify_token(token):
+    claims = decode_token(token)
+    if claims is None:
+        return None
+
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM revoked_tokens WHERE jti = ?", (claims["jti"],)).fetchone():
+        return None
+    row = conn.execute("SELECT revoked_before FROM revoked_users WHERE username = ?", (claims["u"],)).fetchone()
+    if row is not None and claims["iat"] <= row[0]:
+        return None
+    return claims["u"]
+
+# Function to revoke one token, e.g. on logout
+def revoke_token(token):
+    claims = decode_token(token)
+    if claims is None:
+        return
+    conn = get_connection()
+    with write_transaction(conn):
+        conn.execute("INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+                     (claims["jti"], claims["exp"]))
+        # Expired tokens fail verification anyway; keep the list short
+        conn.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (int(time.time()),))
+
+# Function to revoke every token issued to a user so far, e.g. after a password reset
+def revoke_user(username):
+    conn = get_connection()
+    with write_transaction(conn):
+        conn.execute("INSERT OR REPLACE INTO revoked_users (username, revoked_before) VALUES (?, ?)",
+                     (username, time.time()))
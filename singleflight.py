@@ -0,0 +1,140 @@
+import threading
+
+# Single-flight: concurrent identical generation requests share one upstream call.
+# The first caller leads; callers arriving while it is in flight get the same result.
+# Nothing is kept after the call finishes (the generation cache covers repeats).
+
+_lock = threading.Lock()
+_calls = {}    # key -> _Call, blocking calls in flight
+_streams = {}  # key -> _Flight, streams in flight
+_stats = {"calls": 0, "streams": 0, "coalesced": 0, "coalesced_streams": 0, "abandoned_streams": 0}
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+class _Flight:
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.info = {}
+        self.done = False
+        self.subscribers = 0
+        self.cancel = threading.Event()
+        self.cond = threading.Condition()
+
+# Function to run fn once for all concurrent callers with the same key.
+# Returns (fn's result, whether this caller ran it).
+def do(key, fn):
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+            _stats["calls"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.exception is not None:
+            raise call.exception
+        return call.result, False
+
+    try:
+        call.result = fn()
+    except BaseException as e:
+        call.exception = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
+    return call.result, True
+
+# Function to share one streamed generation between concurrent callers with the same key.
+# producer(info, cancel) must return an iterator of text chunks; it runs on a background
+# thread so a caller that goes away (a Streamlit rerun closes its generator) does not cut
+# the stream off for the others. The upstream is cancelled once every caller has left.
+# While no chunk arrives, on_idle(the producer's info dict) is called from the reading thread
+# about twice a second, so a caller can show what the upstream is waiting for. Setting the
+# caller's optional cancel event ends its iterator even while no chunk arrives (e.g. while
+# the upstream waits for a scheduler slot).
+# Returns (iterator of chunks from the start, the producer's info dict, whether this caller started it).
+def stream(key, producer, on_idle=None, cancel=None):
+    with _lock:
+        flight = _streams.get(key)
+        leader = flight is None
+        if leader:
+            flight = _streams[key] = _Flight(key)
+            _stats["streams"] += 1
+        else:
+            _stats["coalesced_streams"] += 1
+        flight.subscribers += 1
+
+    if leader:
+        threading.Thread(target=_produce, args=(key, flight, producer), daemon=True,
+                         name="codegenie-singleflight").start()
+    return _subscribe(flight, on_idle, cancel), flight.info, leader
+
+def _produce(key, flight, producer):
+    chunks = None
+    try:
+        chunks = producer(flight.info, flight.cancel)
+        for chunk in chunks:
+            if flight.cancel.is_set():
+                flight.info["error"] = "Request cancelled"
+                break
+            with flight.cond:
+                flight.chunks.append(chunk)
+                flight.cond.notify_all()
+    except Exception as e:
+        flight.info["error"] = f"Error making API request: {str(e)}"
+    finally:
+        if chunks is not None and hasattr(chunks, "close"):
+            chunks.close()
+        with _lock:
+            if _streams.get(key) is flight:
+                del _streams[key]
+        with flight.cond:
+            flight.done = True
+            flight.cond.notify_all()
+
+def _subscribe(flight, on_idle, cancel):
+    position = 0
+    try:
+        while True:
+            with flight.cond:
+                if position >= len(flight.chunks) and not flight.done:
+                    flight.cond.wait(0.5)
+                new_chunks = flight.chunks[position:]
+                finished = flight.done
+            if not new_chunks and not finished:
+                if cancel is not None and cancel.is_set():
+                    return
+                if on_idle is not None:
+                    on_idle(flight.info)
+                continue
+            for chunk in new_chunks:
+                yield chunk
+            position += len(new_chunks)
+            if finished and position >= len(flight.chunks):
+                return
+    finally:
+        with _lock:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is reading any more: stop the upstream, and let the next caller start afresh
+                flight.cancel.set()
+                if _streams.get(flight.key) is flight:
+                    del _streams[flight.key]
+                _stats["abandoned_streams"] += 1
+
+# Function to report how many requests were coalesced onto another's upstream call
+def singleflight_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["in_flight"] = len(_calls) + len(_streams)
+    return stats
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Shared SQLite setup for the history, user, session and cache stores.
+# Several Streamlit server processes may open the same files, so every connection uses
+# WAL (readers never block the single writer), waits on locks instead of failing,
+# and writes inside BEGIN IMMEDIATE transactions.
+BUSY_TIMEOUT_MS = int(os.environ.get("CODEGENIE_DB_BUSY_TIMEOUT_MS", "10000"))
+
+# Connections opened by thread_connection(), per thread and database file
+_local = threading.local()
+
+# Database files this process has already set up. Creating the schema takes the write
+# lock shared by every process, so it runs once per file and process, not per connection.
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+# Function to open a connection with the multi-process settings, creating the schema
+# the first time this process opens the file
+def open_database(path, schema):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # isolation_level=None: transactions are started explicitly by write_transaction()
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    with _schema_lock:
+        if path not in _schema_ready:
+            # WAL mode is stored in the file, so it only needs setting once
+            conn.execute("PRAGMA journal_mode = WAL")
+            with write_transaction(conn):
+                for statement in schema.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            _schema_ready.add(path)
+    return conn
+
+# Function to get this thread's connection to a database, opening it on first use.
+# A sqlite3 connection must not be shared between threads, and the stores are used from
+# Streamlit's script threads (a new one for each rerun) and from worker pools, so each
+# thread keeps its own. Connections close when their thread ends.
+def thread_connection(path, schema, row_factory=None):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = open_database(path, schema)
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        connections[path] = conn
+    return conn
+
+# Context manager for a write transaction. The write lock is taken up front, so a
+# read-modify-write inside it cannot interleave with another process's writes.
+@contextmanager
+def write_transaction(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+# Function to write a file atomically: readers see the old content or the new, never a partial file
+def atomic_write(path, data, mode=0o644):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# Function to create a file only if it does not exist yet, atomically.
+# Returns False when another process created it first.
+def atomic_create(path, data, mode=0o600):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        # link() fails if the target exists, and the target never appears half-written
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
@@ -0,0 +1,84 @@
+import os
+import re
+import threading
+from collections import deque
+
+import prompt_templates
+
+# Adaptive max_new_tokens: the sidebar's max_length is only the upper bound, and each
+# request gets a budget sized from its prompt and language. Turn off with CODEGENIE_ADAPTIVE_TOKENS=0.
+ADAPTIVE = os.environ.get("CODEGENIE_ADAPTIVE_TOKENS", "1") == "1"
+MIN_NEW_TOKENS = int(os.environ.get("CODEGENIE_MIN_NEW_TOKENS", "128"))
+
+# Typical answer size per language, in tokens
+_LANGUAGE_BASE = {
+    "Python": 180, "JavaScript": 220, "Java": 280, "C++": 260, "C": 240, "C#": 280,
+    "Go": 240, "Ruby": 180, "PHP": 220, "Swift": 240, "Kotlin": 240, "Rust": 260,
+    "TypeScript": 240, "HTML": 320, "CSS": 220, "SQL": 120, "Shell/Bash": 140,
+    "Perl": 180, "R": 180, "MATLAB": 180
+}
+DEFAULT_BASE = 220
+
+# Words that hint at a bigger or smaller answer than usual
+_LARGER = {"class", "classes", "app", "application", "api", "server", "game", "website", "page", "complete",
+           "full", "crud", "system", "program", "gui", "interface", "module", "tests", "library", "cli"}
+_SMALLER = {"query", "regex", "one-liner", "oneliner", "snippet", "command", "expression", "line", "lambda"}
+
+_WORD_RE = re.compile(r"[\w-]+")
+# Rough token count for backends that do not report one
+_TOKEN_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]")
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "tokens_generated": 0, "tokens_budgeted": 0, "tokens_cap": 0,
+          "stopped_early": 0, "hit_budget": 0, "budget_retries": 0}
+_recent = deque(maxlen=200)  # (language, tokens generated, budget, finish reason)
+
+# Function to pick max_new_tokens for a request, never above the cap
+def estimate_max_new_tokens(prompt, language, cap):
+    if not ADAPTIVE:
+        return cap
+    words = _WORD_RE.findall(prompt.lower())
+    budget = _LANGUAGE_BASE.get(language, DEFAULT_BASE) + 3 * len(words)
+    if any(word in _LARGER for word in words):
+        budget *= 1.5
+    elif any(word in _SMALLER for word in words):
+        budget *= 0.6
+    if prompt_templates.is_web_project(prompt):
+        budget *= 1.6
+    return int(min(cap, max(MIN_NEW_TOKENS, budget)))
+
+# Function to estimate the number of tokens in a text
+def estimate_tokens(text):
+    return len(_TOKEN_ESTIMATE_RE.findall(text))
+
+# Function to record how many tokens a generation used
+def record_usage(language, tokens, budget, cap, finish_reason, budget_retry=False):
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["tokens_generated"] += tokens
+        _stats["tokens_budgeted"] += budget
+        _stats["tokens_cap"] += cap
+        if finish_reason == "length":
+            _stats["hit_budget"] += 1
+        else:
+            _stats["stopped_early"] += 1
+        if budget_retry:
+            _stats["budget_retries"] += 1
+        _recent.append((language, tokens, budget, finish_reason))
+
+# Function to report token usage: what was generated against the budgets and the fixed cap
+def token_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+        recent = list(_recent)
+    requests = stats["requests"]
+    stats["adaptive"] = ADAPTIVE
+    stats["avg_tokens"] = stats["tokens_generated"] / requests if requests else 0.0
+    stats["avg_budget"] = stats["tokens_budgeted"] / requests if requests else 0.0
+    # Tokens not decoded compared with always running to the cap
+    stats["tokens_saved_vs_cap"] = stats["tokens_cap"] - stats["tokens_generated"]
+    stats["recent"] = [
+        {"language": language, "tokens": tokens, "budget": budget, "finish_reason": finish_reason}
+        for language, tokens, budget, finish_reason in recent[-10:]
+    ]
+    return stats
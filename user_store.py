@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import sys
+
+from storage import thread_connection, write_transaction
+
+# Location of the user store and of the legacy JSON database it replaces
+USERS_DIR = "users"
+USER_DB = os.path.join(USERS_DIR, "users.db")
+LEGACY_JSON = os.path.join(USERS_DIR, "user_database.json")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL,
+    creation_date TEXT,
+    last_login TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Function to get this thread's connection to the user store
+def get_connection():
+    return thread_connection(USER_DB, _SCHEMA, sqlite3.Row)
+
+# Function to look up a user by username. Returns a dict or None.
+def get_user(username):
+    row = get_connection().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    return dict(row) if row is not None else None
+
+# Function to look up a user by email. Returns a dict or None.
+def get_user_by_email(email):
+    row = get_connection().execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+    return dict(row) if row is not None else None
+
+# Function to count registered users
+def count_users():
+    return get_connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+# Function to add a user. Returns (success, message) like the login functions.
+def create_user(username, password_hash, email, creation_date, last_login=None):
+    conn = get_connection()
+    try:
+        with write_transaction(conn):
+            conn.execute(
+                "INSERT INTO users (username, password, email, creation_date, last_login) VALUES (?, ?, ?, ?, ?)",
+                (username, password_hash, email, creation_date, last_login)
+            )
+    except sqlite3.IntegrityError as e:
+        if "email" in str(e):
+            return False, "Email already in use"
+        return False, "Username already exists"
+    return True, "Registration successful"
+
+# Function to set the password hash of one user
+def update_password(username, password_hash):
+    conn = get_connection()
+    with write_transaction(conn):
+        cursor = conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+    return cursor.rowcount == 1
+
+# Function to record a successful login
+def update_last_login(username, last_login):
+    conn = get_connection()
+    with write_transaction(conn):
+        conn.execute("UPDATE users SET last_login = ? WHERE username = ?", (last_login, username))
+
+# Function to import users from the legacy JSON database.
+# Existing usernames are left alone; returns (imported count, skipped usernames).
+def migrate_json(path=LEGACY_JSON):
+    if not os.path.exists(path):
+        return 0, []
+
+    with open(path, "r") as f:
+        users = json.load(f)
+
+    conn = get_connection()
+    imported = 0
+    skipped = []
+    with write_transaction(conn):
+        for username, user in users.items():
+            if conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+                continue
+            try:
+                conn.execute(
+                    "INSERT INTO users (username, password, email, creation_date, last_login) VALUES (?, ?, ?, ?, ?)",
+                    (username, user["password"], user["email"], user.get("creation_date"), user.get("last_login"))
+                )
+                imported += 1
+            except sqlite3.IntegrityError:
+                # Another user already has this email
+                skipped.append(username)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+    return imported, skipped
+
+# Function to run the JSON migration once per user store
+def migrate_json_once(path=LEGACY_JSON):
+    row = get_connection().execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+    if row is not None:
+        return 0, []
+    return migrate_json(path)
+
+# Run `python user_store.py migrate` to import the legacy JSON database by hand
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        imported, skipped = migrate_json()
+        print(f"Imported {imported} user(s) into {USER_DB}")
+        for username in skipped:
+            print(f"Skipped {username}: email already used by another account")
+    else:
+        print("Usage: python user_store.py migrate")